@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the card analysis API.
+
+Starts the app in-process (no network, no uvicorn), optionally builds every
+neural network as a deterministic stub instead of loading its weights,
+replays a corpus of deals against /analyze at a fixed concurrency and reports
+throughput, latency percentiles and peak RSS. Results can be saved as a
+baseline and later runs compared against it, failing (exit 1) on regressions.
+
+Stub mode still runs Ben's Python code, so it needs a Ben checkout and
+TensorFlow, and reads each network's architecture (not its weights) from the
+model files. Load time and RSS are then those of the stubs.
+
+The bundled bench/corpus.jsonl is synthetic: seeded random hands, eight fixed
+auctions (two deals each, unrelated to the hands) and up to four legal cards
+of the opening trick. It exercises auctions and play prefixes of typical
+lengths, not a realistic mix of deals; use --corpus for real exports.
+
+Run from Ben's src directory (where card_analysis_api.py lives):
+
+    python benchmark.py                        # compare with bench/baseline.json
+    python benchmark.py --save-baseline        # record a new baseline
+    python benchmark.py --models real -c 8     # real models, 8 concurrent requests
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import zipfile
+import zlib
+from collections import namedtuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(HERE, 'bench', 'corpus.jsonl')
+DEFAULT_BASELINE = os.path.join(HERE, 'bench', 'baseline.json')
+
+# Metrics compared against the baseline: name -> True if higher is better
+COMPARED = {"throughput_rps": True, "p50_ms": False, "p95_ms": False, "p99_ms": False}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the card analysis API in-process")
+    p.add_argument('--corpus', default=DEFAULT_CORPUS,
+                   help="JSONL of /analyze request bodies (default: the bundled synthetic sample)")
+    p.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON to compare with / save to")
+    p.add_argument('-c', '--concurrency', type=int, default=4, help="Requests in flight at once")
+    p.add_argument('-n', '--repeat', type=int, default=3, help="Passes over the corpus")
+    p.add_argument('--models', choices=['stub', 'real'], default='stub',
+                   help="stub: deterministic fake forward passes (measures the Python path); real: TF models")
+    p.add_argument('--stub-latency-ms', type=float, default=0.0, help="Fixed delay added to every stub model call")
+    p.add_argument('--warm-caches', action='store_true',
+                   help="Keep the result cache and incremental replay on (default: off, every request is computed)")
+    p.add_argument('--tolerance', type=float, default=0.15, help="Allowed relative regression before failing")
+    p.add_argument('--save-baseline', action='store_true', help="Write this run's results as the new baseline")
+    p.add_argument('--json', action='store_true', help="Print the results as JSON only")
+    return p.parse_args(argv)
+
+
+# ============================================================
+# Deterministic stub networks
+# ============================================================
+
+# Input/output spec of a network, all the stubs keep of its architecture
+_Spec = namedtuple('_Spec', 'shape dtype')
+
+
+class StubNetwork:
+    """
+    Stand-in for a Keras model: same input/output specs, no weights, no TF compute.
+
+    Each output row is a softmax of pseudo-random logits seeded by a CRC of the
+    matching input rows, so results are reproducible and independent of how
+    rows are batched together.
+    """
+
+    def __init__(self, inputs, outputs, latency_ms=0.0):
+        self.inputs = inputs
+        self.outputs = outputs
+        self._latency = latency_ms / 1000.0
+
+    def _forward(self, x):
+        import numpy as np
+        leaves = [a.numpy() if hasattr(a, 'numpy') else np.asarray(a) for a in (x if isinstance(x, (list, tuple)) else [x])]
+        batch = leaves[0].shape[0]
+        seeds = [zlib.crc32(b''.join(np.ascontiguousarray(a[i]).tobytes() for a in leaves)) for i in range(batch)]
+        outs = []
+        for spec in self.outputs:
+            dims = []
+            for axis, d in enumerate(tuple(spec.shape)[1:], start=1):
+                if d is None:
+                    d = leaves[0].shape[axis] if axis < leaves[0].ndim else 1
+                dims.append(d)
+            rows = [np.random.default_rng(seed).standard_normal(dims) for seed in seeds]
+            logits = np.stack(rows).astype('float32') if rows else np.zeros([0] + dims, 'float32')
+            e = np.exp(logits - logits.max(axis=-1, keepdims=True))
+            outs.append(e / e.sum(axis=-1, keepdims=True))
+        if self._latency:
+            time.sleep(self._latency)
+        return outs[0] if len(outs) == 1 else outs
+
+    def __call__(self, x, training=False, **kwargs):
+        import tensorflow as tf
+        out = self._forward(x)
+        if isinstance(out, list):
+            return [tf.convert_to_tensor(o) for o in out]
+        return tf.convert_to_tensor(out)
+
+    def predict(self, x, *args, **kwargs):
+        return self._forward(x)
+
+    def predict_on_batch(self, x, *args, **kwargs):
+        return self._forward(x)
+
+    def get_weights(self):
+        return []
+
+
+def _saved_config(path):
+    """Architecture JSON of a saved Keras model (.keras archive or HDF5), without reading its weights"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return archive.read('config.json').decode()
+    import h5py
+    with h5py.File(path, 'r') as f:
+        config = f.attrs['model_config']
+    return config.decode() if isinstance(config, bytes) else config
+
+
+def _architecture(path, custom_objects=None):
+    """Untrained model built from a saved model's architecture"""
+    import tensorflow as tf
+    return tf.keras.models.model_from_json(_saved_config(path), custom_objects=custom_objects)
+
+
+def stub_factory(latency_ms):
+    """load_model replacement for api.load_models(): a StubNetwork per network file"""
+    def load_stub(*args, **kwargs):
+        path = str(args[0] if args else kwargs['filepath'])
+        model = _architecture(path, kwargs.get('custom_objects'))
+        return StubNetwork([_Spec(tuple(t.shape), t.dtype) for t in model.inputs],
+                           [_Spec(tuple(t.shape), t.dtype) for t in model.outputs], latency_ms)
+    return load_stub
+
+
+# ============================================================
+# Load generation
+# ============================================================
+
+def load_corpus(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+async def replay(app, deals, concurrency, repeat):
+    import httpx
+    latencies, errors = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(deal):
+            async with semaphore:
+                start = time.perf_counter()
+                r = await client.post('/analyze', json=deal)
+                elapsed = time.perf_counter() - start
+            if r.status_code == 200:
+                latencies.append(elapsed)
+            else:
+                errors.append(f"{r.status_code}: {r.text[:200]}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(deal) for _ in range(repeat) for deal in deals))
+        wall = time.perf_counter() - start
+    return latencies, errors, wall
+
+
+def run(args):
+    if not args.warm_caches:
+        os.environ['BEN_CACHE_SIZE'] = '0'
+        os.environ['BEN_CACHE_DIR'] = ''
+        os.environ['BEN_DEAL_STATES'] = '0'
+    os.environ.setdefault('BEN_WARMUP_BATCH_SIZES', '1,8,64')
+    # The admission queue must hold the whole benchmark burst
+    os.environ.setdefault('BEN_MAX_QUEUE', str(max(16, args.concurrency)))
+    sys.path.insert(0, os.getcwd())
+    import card_analysis_api as api
+
+    start = time.perf_counter()
+    api.load_models(stub_factory(args.stub_latency_ms) if args.models == 'stub' else None)
+    load_seconds = time.perf_counter() - start
+    api.warm_up_models(api.models, api._warmup_batch_sizes())
+    api.readiness["state"] = "ready"
+
+    deals = load_corpus(args.corpus)
+    latencies, errors, wall = asyncio.run(replay(api.app, deals, args.concurrency, args.repeat))
+    ms = [l * 1000 for l in latencies]
+    return {
+        "requests": len(latencies) + len(errors),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "p50_ms": round(percentile(ms, 50), 2) if ms else None,
+        "p95_ms": round(percentile(ms, 95), 2) if ms else None,
+        "p99_ms": round(percentile(ms, 99), 2) if ms else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "load_seconds": round(load_seconds, 2),
+        "config": {"models": args.models, "concurrency": args.concurrency, "repeat": args.repeat,
+                   "deals": len(deals), "warm_caches": args.warm_caches,
+                   "stub_latency_ms": args.stub_latency_ms, "python": platform.python_version(),
+                   "cpus": os.cpu_count()},
+    }
+
+
+def compare(result, baseline, tolerance):
+    """List of regression messages (empty when within tolerance)"""
+    regressions = []
+    for name, higher_is_better in COMPARED.items():
+        new, old = result.get(name), baseline.get(name)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append(f"{name}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run(args)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"\n📊 {result['requests']} requests, {result['errors']} errors "
+              f"({result['config']['models']} models, concurrency {args.concurrency})")
+        print(f"   throughput  {result['throughput_rps']} req/s")
+        print(f"   latency     p50 {result['p50_ms']} ms | p95 {result['p95_ms']} ms | p99 {result['p99_ms']} ms")
+        print(f"   peak RSS    {result['peak_rss_mb']} MB")
+        for sample in result['error_samples']:
+            print(f"   ❌ {sample}")
+
+    if result['errors']:
+        return 1
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"✅ Baseline written to {args.baseline}")
+        return 0
+
+    # Without a comparable baseline there is nothing to gate on; that is a failure, not a pass
+    if not os.path.exists(args.baseline):
+        print(f"❌ No baseline at {args.baseline}; run with --save-baseline to record one")
+        return 1
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config", {}).get("models") != args.models:
+        print(f"❌ Baseline was recorded with {baseline.get('config', {}).get('models')} models, "
+              f"not {args.models}; record one with --save-baseline")
+        return 1
+    regressions = compare(result, baseline, args.tolerance)
+    if regressions:
+        print(f"❌ Regressions beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"   {line}")
+        return 1
+    print(f"✅ Within {args.tolerance:.0%} of baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Offline bulk analysis of PBN and LIN files.
+
+Streams boards out of the input files and shards them across a pool of worker
+processes, each with its own copy of Ben's models, loaded exactly as the API
+loads them. Every board runs through the same CardByCard pipeline as /analyze.
+Results are written as they finish, to JSONL or to a directory of Parquet
+parts. Completed boards are checkpointed, so an interrupted run picks up
+where it stopped with --resume.
+
+Run from Ben's src directory (where card_analysis_api.py lives):
+
+    python bulk_analyze.py archive/*.pbn -o results.jsonl
+    python bulk_analyze.py club.lin -o results/ --format parquet -p 8
+    python bulk_analyze.py archive/*.pbn -o results.jsonl --resume    # after an interruption
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import multiprocessing
+
+SEATS = 'NESW'
+RANKS = 'AKQJT98765432'
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Analyze PBN/LIN archives with Ben, without the HTTP API")
+    p.add_argument('inputs', nargs='+', help="PBN (.pbn) or LIN (.lin) files")
+    p.add_argument('-o', '--output', required=True, help="JSONL file, or directory for --format parquet")
+    p.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl')
+    p.add_argument('-p', '--processes', type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                   help="Worker processes, each holding one copy of the models")
+    p.add_argument('-t', '--threads', type=int, default=4,
+                   help="Boards analyzed at once per process (their model calls are batched together)")
+    p.add_argument('--resume', action='store_true', help="Skip boards already in the output")
+    p.add_argument('--checkpoint-every', type=int, default=200,
+                   help="Boards between durable checkpoints (fsync / Parquet part)")
+    p.add_argument('--cache-dir', default=None, help="Share a BEN_CACHE_DIR result cache with the API")
+    p.add_argument('--tier', default='standard', help="Analysis depth tier (fast, standard, thorough, ...)")
+    p.add_argument('--limit', type=int, default=0, help="Stop after this many boards (0: all)")
+    p.add_argument('-v', '--verbose', action='store_true', help="Keep the workers' INFO logging")
+    return p.parse_args(argv)
+
+
+# ============================================================
+# PBN / LIN parsing (streaming; one board dict at a time)
+# ============================================================
+
+def _vuln(text):
+    text = text.strip().upper()
+    return [text in ('NS', 'N', 'ALL', 'BOTH', 'B'), text in ('EW', 'E', 'ALL', 'BOTH', 'B')]
+
+
+def _trick_winner(cards, leader, trump):
+    """Seat winning a trick given {seat: card} and the seat that led"""
+    led = cards[leader][0]
+
+    def strength(card):
+        suit, rank = card[0], RANKS.index(card[1])
+        if suit == trump:
+            return 2, -rank
+        return (1, -rank) if suit == led else (0, 0)
+    return max(cards, key=lambda seat: strength(cards[seat]))
+
+
+def _pbn_play(auction, leader, lines):
+    """Cards in the order played, from a PBN play section (columns by seat, not by order)"""
+    contract = next((call for call in reversed(auction) if call[0].isdigit()), None)
+    trump = contract[1] if contract and contract[1] in 'SHDC' else None
+    play = []
+    seat = leader
+    for line in lines:
+        tokens = line.split()
+        cards = {(leader + i) % 4: tok.upper() for i, tok in enumerate(tokens[:4])
+                 if len(tok) == 2 and tok[0].upper() in 'SHDC'}
+        if len(cards) < 4:
+            # Last, incomplete trick: what was played, starting with whoever was on lead
+            play += [cards[(seat + i) % 4] for i in range(4) if (seat + i) % 4 in cards]
+            break
+        play += [cards[(seat + i) % 4] for i in range(4)]
+        seat = _trick_winner(cards, seat, trump)
+    return play
+
+
+def _pbn_calls(lines):
+    calls = []
+    for line in lines:
+        for tok in re.sub(r'\{[^}]*\}', ' ', line).split():
+            tok = tok.upper().rstrip('!')
+            if tok.startswith(('=', '$', '*')) or tok in ('-', '+'):
+                continue
+            if tok == 'AP':
+                calls += ['PASS'] * 3
+                break
+            calls.append({'P': 'PASS', 'PASS': 'PASS', 'X': 'X', 'XX': 'XX'}.get(tok, tok.replace('NT', 'N')))
+    return calls
+
+
+def read_pbn(path):
+    """Boards of a PBN file"""
+    ordinal = 0
+
+    def board_from(tags, sections):
+        deal = tags.get('Deal', '')
+        first, _, hands = deal.partition(':')
+        hands = hands.split()
+        if first not in SEATS or len(hands) != 4:
+            return None
+        start = SEATS.index(first)
+        by_seat = [hands[(i - start) % 4] for i in range(4)]
+        dealer = tags.get('Dealer', 'N')[:1] or 'N'
+        auction = _pbn_calls(sections.get('Auction', []))
+        play = []
+        if tags.get('Play', '')[:1] in SEATS and sections.get('Play'):
+            play = _pbn_play(auction, SEATS.index(tags['Play'][:1]), sections['Play'])
+        return {"source": path, "board": tags.get('Board'), "dealer": dealer,
+                "vuln": _vuln(tags.get('Vulnerable', 'None')), "hands": by_seat,
+                "auction": auction, "play": play}
+
+    tags, sections, section = {}, {}, None
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('%'):
+                if not line and 'Deal' in tags:
+                    board = board_from(tags, sections)
+                    if board:
+                        yield dict(board, id=f"{path}#{ordinal}")
+                        ordinal += 1
+                    tags, sections, section = {}, {}, None
+                continue
+            m = re.match(r'\[(\w+)\s+"(.*)"\]', line)
+            if m:
+                tag, value = m.groups()
+                if tag == 'Event' and 'Deal' in tags:
+                    board = board_from(tags, sections)
+                    if board:
+                        yield dict(board, id=f"{path}#{ordinal}")
+                        ordinal += 1
+                    tags, sections = {}, {}
+                tags[tag] = value
+                section = tag if tag in ('Auction', 'Play') else None
+                continue
+            if section:
+                sections.setdefault(section, []).append(line)
+    if 'Deal' in tags:
+        board = board_from(tags, sections)
+        if board:
+            yield dict(board, id=f"{path}#{ordinal}")
+
+
+def _lin_pairs(f):
+    """(key, value) pairs of a LIN file; values may span lines"""
+    buffer, key = '', None
+    for line in f:
+        buffer += line.rstrip('\r\n')
+        parts = buffer.split('|')
+        buffer = parts.pop()
+        for part in parts:
+            if key is None:
+                key = part.strip().lower()
+            else:
+                yield key, part
+                key = None
+
+
+def _lin_hand(text):
+    """'SAK5HQJ3DKQ82CAT3' -> 'AK5.QJ3.KQ82.AT3'"""
+    suits, current = {s: '' for s in 'SHDC'}, None
+    for ch in text.upper():
+        if ch in suits:
+            current = ch
+        elif current and ch in RANKS:
+            suits[current] += ch
+    return '.'.join(''.join(sorted(suits[s], key=RANKS.index)) for s in 'SHDC')
+
+
+def _lin_board(path, ordinal, fields):
+    md = fields.get('md')
+    if not md:
+        return None
+    dealer = {'1': 'S', '2': 'W', '3': 'N', '4': 'E'}.get(md[:1], 'N')
+    given = [_lin_hand(h) for h in md[1:].split(',')[:4]]
+    given += [''] * (4 - len(given))
+    if sum(len(h) - 3 for h in given if h) == 39 and sum(1 for h in given if len(h) > 3) == 3:
+        # Fourth hand left out: it holds whatever the others don't
+        held = {s + r for h in given if h for s, ranks in zip('SHDC', h.split('.')) for r in ranks}
+        missing = next(i for i, h in enumerate(given) if len(h) <= 3)
+        given[missing] = '.'.join(''.join(r for r in RANKS if s + r not in held) for s in 'SHDC')
+    # LIN lists hands South, West, North, East
+    hands = [given[2], given[3], given[0], given[1]]
+    calls = [{'P': 'PASS', 'D': 'X', 'R': 'XX'}.get(c.upper(), c.upper().replace('NT', 'N'))
+             for c in (c.strip().rstrip('!') for c in fields.get('mb', [])) if c]
+    return {"id": f"{path}#{ordinal}", "source": path, "board": fields.get('board'), "dealer": dealer,
+            "vuln": _vuln({'O': 'None', '0': 'None', '-': 'None', 'N': 'NS', 'E': 'EW', 'B': 'All'}
+                          .get(fields.get('sv', 'o').strip().upper()[:1], 'None')),
+            "hands": hands, "auction": calls, "play": [c.strip().upper() for c in fields.get('pc', [])]}
+
+
+def read_lin(path):
+    """Boards of a LIN file (one or many per file, separated by qx/md)"""
+    ordinal, fields = 0, {}
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for key, value in _lin_pairs(f):
+            if key in ('qx', 'md') and 'md' in fields:
+                board = _lin_board(path, ordinal, fields)
+                if board:
+                    yield board
+                    ordinal += 1
+                fields = {}
+            if key in ('mb', 'pc'):
+                fields.setdefault(key, []).append(value)
+            elif key == 'qx':
+                fields['board'] = value.lstrip('oc')
+            elif key == 'ah' and 'board' not in fields:
+                fields['board'] = value.replace('Board', '').strip()
+            else:
+                fields[key] = value
+    board = _lin_board(path, ordinal, fields)
+    if board:
+        yield board
+
+
+def read_boards(paths):
+    for path in paths:
+        reader = read_lin if path.lower().endswith('.lin') else read_pbn
+        yield from reader(path)
+
+
+# ============================================================
+# Worker processes
+# ============================================================
+
+_api = None
+
+
+def _init_worker(verbose):
+    """Load the models once per process, the same way the API does"""
+    global _api
+    # Each board is analyzed once, so replay state kept per deal for later
+    # requests would only cost memory. The sample memo lives in that state and
+    # goes with it after every board
+    os.environ['BEN_DEAL_STATES'] = '0'
+    sys.path.insert(0, os.getcwd())
+    import card_analysis_api as api
+    import logging
+    if not verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    api.load_models()
+    _api = api
+
+
+def _analyze_board(board):
+    start = time.time()
+    record = {"id": board["id"], "source": board["source"], "board": board["board"]}
+    try:
+        deal = _api.Deal.parse(board["dealer"], board["vuln"], board["hands"], board["auction"], board["play"])
+        request = _api.AnalysisRequest.from_deal(deal, board.get("tier", "standard"))
+        key, result = _api._cached(request)
+        if result is None:
+            result = _api._analyze_deal(request, key)
+        record.update(_api._plain(result))
+    except Exception as e:
+        record.update(status="error", detail=str(e))
+    record["seconds"] = round(time.time() - start, 3)
+    return record
+
+
+def _analyze_chunk(boards):
+    """Analyze boards side by side so the batcher merges their model calls"""
+    with ThreadPoolExecutor(max_workers=len(boards)) as pool:
+        return list(pool.map(_analyze_board, boards))
+
+
+# ============================================================
+# Output with checkpointing
+# ============================================================
+
+class JsonlSink:
+    """
+    One JSON object per line; the file itself is the checkpoint. Resuming
+    keeps the successful boards and drops error records, so those are retried.
+    """
+
+    def __init__(self, path, resume):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path) and not resume:
+            raise SystemExit(f"❌ {path} exists; pass --resume to continue it or remove it")
+        if resume and os.path.exists(path):
+            kept, dropped = [], False
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        board = record["id"]
+                    except (ValueError, KeyError):
+                        dropped = True
+                        break  # torn last line of an interrupted run
+                    if record.get("status") == "success":
+                        self.done.add(board)
+                        kept.append(line)
+                    else:
+                        dropped = True
+            if dropped:
+                with open(path + '.tmp', 'wb') as f:
+                    f.writelines(kept)
+                os.replace(path + '.tmp', path)
+        self._f = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        self._f.write(json.dumps(record, default=_json_default) + '\n')
+
+    def checkpoint(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        self.checkpoint()
+        self._f.close()
+
+
+class ParquetSink:
+    """
+    Directory of Parquet parts, one per checkpoint; a part is renamed into
+    place when complete. Resuming rewrites parts without their error rows, so
+    those boards are retried.
+    """
+
+    def __init__(self, path, resume):
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise SystemExit("❌ --format parquet needs pyarrow (pip install pyarrow)")
+        import pyarrow.parquet as pq
+        self.path = path
+        self.done = set()
+        self._rows = []
+        parts = sorted(p for p in os.listdir(path) if p.endswith('.parquet')) if os.path.isdir(path) else []
+        if parts and not resume:
+            raise SystemExit(f"❌ {path} already has results; pass --resume to continue it or remove them")
+        for part in parts:
+            part = os.path.join(path, part)
+            table = pq.read_table(part)
+            ok = [status == "success" for status in table.column('status').to_pylist()]
+            if not all(ok):
+                import pyarrow as pa
+                pq.write_table(table.filter(pa.array(ok)), part + '.tmp')
+                os.replace(part + '.tmp', part)
+            self.done.update(board for board, good in zip(table.column('id').to_pylist(), ok) if good)
+        self._next = len(parts)
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, record):
+        self._rows.append({
+            "id": record["id"], "source": record["source"], "board": record.get("board"),
+            "status": record.get("status"), "detail": record.get("detail"), "seconds": record.get("seconds"),
+            "bidding": json.dumps(record.get("bidding", []), default=_json_default),
+            "play": json.dumps(record.get("play", []), default=_json_default),
+        })
+
+    def checkpoint(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        final = os.path.join(self.path, f"part-{self._next:05d}.parquet")
+        pq.write_table(pa.Table.from_pylist(self._rows), final + '.tmp')
+        os.replace(final + '.tmp', final)
+        self._next += 1
+        self._rows = []
+
+    def close(self):
+        self.checkpoint()
+
+
+def _json_default(value):
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# ============================================================
+# Driver
+# ============================================================
+
+def _chunks(boards, size):
+    chunk = []
+    for board in boards:
+        chunk.append(board)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sink = (ParquetSink if args.format == 'parquet' else JsonlSink)(args.output, args.resume)
+    if sink.done:
+        print(f"↩️  Resuming: {len(sink.done)} boards already done", file=sys.stderr)
+
+    # Inherited by the workers: split the cores between them, no in-memory
+    # result cache (each board is seen once) unless a shared disk cache is given
+    os.environ['BEN_WORKERS'] = str(args.processes)
+    os.environ['BEN_TF_INTER_OP_THREADS'] = str(args.threads)
+    os.environ['BEN_CACHE_SIZE'] = '0'
+    if args.cache_dir:
+        os.environ['BEN_CACHE_DIR'] = args.cache_dir
+
+    boards = (dict(b, tier=args.tier) for b in read_boards(args.inputs) if b["id"] not in sink.done)
+    if args.limit:
+        boards = (b for _, b in zip(range(args.limit), boards))
+
+    counts = {"success": 0, "error": 0}
+    since_checkpoint = 0
+    start = time.time()
+    # TF is not fork-safe; every worker starts clean and loads its own models
+    pool = ProcessPoolExecutor(max_workers=args.processes, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker, initargs=(args.verbose,))
+    pending = set()
+
+    def collect(done):
+        nonlocal since_checkpoint
+        for future in done:
+            for record in future.result():
+                sink.write(record)
+                counts["success" if record.get("status") == "success" else "error"] += 1
+                since_checkpoint += 1
+        if since_checkpoint >= args.checkpoint_every:
+            sink.checkpoint()
+            since_checkpoint = 0
+            total = counts["success"] + counts["error"]
+            print(f"   {total} boards ({counts['error']} errors), {total / (time.time() - start):.2f} boards/s",
+                  file=sys.stderr)
+
+    try:
+        for chunk in _chunks(boards, args.threads):
+            pending.add(pool.submit(_analyze_chunk, chunk))
+            # Keep every worker busy without reading the whole archive into memory
+            if len(pending) >= args.processes * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted; finished boards are saved, rerun with --resume", file=sys.stderr)
+        pool.shutdown(wait=False, cancel_futures=True)
+        sink.close()
+        return 130
+    pool.shutdown()
+    sink.close()
+
+    total = counts["success"] + counts["error"]
+    print(f"✅ {total} boards in {time.time() - start:.0f}s ({counts['error']} errors) -> {args.output}",
+          file=sys.stderr)
+    return 0 if counts["success"] or not total else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
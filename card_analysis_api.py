@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 """
 Ben Card Analysis API - Neural Network Only
-No DDS, No BBA - Pure Python mocks
+No native DDS (pure-Python solver in dd_solver.py), No BBA - Pure Python mocks
 """
 
 import sys
 import os
 import ctypes
+import time
+
+_BOOT_TIME = time.time()
 
 # ============================================================
 # STEP 0: PREVENT ALL DDS LIBRARY LOADING
@@ -70,40 +73,50 @@ fake_ddsolver.dds = MockDDS()
 def _noop(*args, **kwargs):
     return 0
 
-fake_ddsolver.SetMaxThreads = _noop
-fake_ddsolver.SetThreading = _noop
-fake_ddsolver.SetResources = _noop
-fake_ddsolver.FreeMemory = _noop
-fake_ddsolver.SolveBoard = _noop
-fake_ddsolver.SolveBoardPBN = _noop
-fake_ddsolver.CalcDDtable = _noop
-fake_ddsolver.CalcDDtablePBN = _noop
-fake_ddsolver.CalcAllTables = _noop
-fake_ddsolver.CalcAllTablesPBN = _noop
+# Double-dummy entry points are served by the pure-Python solver
+import dd_solver
+
+_DD_FUNCTIONS = ['SetMaxThreads', 'SetThreading', 'SetResources', 'FreeMemory',
+                 'SolveBoard', 'SolveBoardPBN', 'CalcDDtable', 'CalcDDtablePBN',
+                 'CalcAllTables', 'CalcAllTablesPBN']
+
+for name in _DD_FUNCTIONS:
+    setattr(fake_ddsolver, name, getattr(dd_solver, name))
 fake_ddsolver.SolveAllBoards = _noop
 fake_ddsolver.Par = _noop
 fake_ddsolver.CalcPar = _noop
 fake_ddsolver.AnalysePlayBin = _noop
 fake_ddsolver.AnalysePlayPBN = _noop
 
+# Ben does `from ddsolver import ddsolver` and uses ddsolver.DDSolver
+fake_ddsolver.ddsolver = dd_solver
+fake_ddsolver.DDSolver = dd_solver.DDSolver
+
 # Also create a fake dds module
 fake_dds = types.ModuleType('dds')
 fake_dds.__file__ = '/fake/dds/__init__.py'
-for name in ['SetMaxThreads', 'SetThreading', 'SetResources', 'FreeMemory', 
-             'SolveBoard', 'CalcDDtable', 'CalcDDtablePBN']:
-    setattr(fake_dds, name, _noop)
+for name in _DD_FUNCTIONS:
+    setattr(fake_dds, name, getattr(dd_solver, name))
 
 # Install mocks in sys.modules BEFORE any Ben imports
 sys.modules['dds'] = fake_dds
 sys.modules['ddsolver'] = fake_ddsolver
 sys.modules['ddsolver.dds'] = fake_dds
+sys.modules['ddsolver.ddsolver'] = dd_solver
 
-print("Mocked dds and ddsolver modules")
+print("Mocked dds and ddsolver modules (double dummy via dd_solver)")
 
 # ============================================================
 # STEP 2: PATCH SOURCE FILES
 # ============================================================
 
+def _write_atomic(path, content):
+    """Replace path in one step; processes starting together never read a half-written file"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
 def patch_files():
     """Patch Ben files to work without DDS/BBA"""
     
@@ -113,8 +126,7 @@ def patch_files():
     # 1. Replace bba/BBA.py completely
     bba_file = 'bba/BBA.py'
     if os.path.exists(bba_file):
-        with open(bba_file, 'w') as f:
-            f.write('''
+        _write_atomic(bba_file, '''
 # Mock BBA - no Windows DLL needed
 class BBA:
     def __init__(self, *a, **k): pass
@@ -150,8 +162,7 @@ def BBA_PLAYER(*a, **k):
                 line = line.replace('aceking[', '(aceking or {})[')
             new_lines.append(line)
         
-        with open(sample_py, 'w') as f:
-            f.writelines(new_lines)
+        _write_atomic(sample_py, ''.join(new_lines))
     
     # 4. Patch botbidder.py for aceking safety
     botbidder_py = 'botbidder.py'
@@ -171,8 +182,7 @@ def BBA_PLAYER(*a, **k):
             line = line.replace('len(aceking)', 'len(aceking or {})')
             new_lines.append(line)
         
-        with open(botbidder_py, 'w') as f:
-            f.writelines(new_lines)
+        _write_atomic(botbidder_py, ''.join(new_lines))
     
     # NOTE: We don't comment out ddsolver imports - they will use our mock from sys.modules
     
@@ -182,33 +192,325 @@ def BBA_PLAYER(*a, **k):
         with open(config, 'r') as f:
             content = f.read()
         content = content.replace('consult_bba = True', 'consult_bba = False')
-        with open(config, 'a') as f:
-            f.write('\nconsult_bba = False\n')
+        # Only append once - a second copy in the same section makes
+        # ConfigParser raise DuplicateOptionError on the next start
+        if not content.rstrip().endswith('consult_bba = False'):
+            content += '\nconsult_bba = False\n'
+        _write_atomic(config, content)
     
     # NOTE: All ddsolver imports will use our mock from sys.modules - no need to comment them out
 
-print("Patching Ben files...")
-patch_files()
-print("Done patching!")
+# Written by `python card_analysis_api.py --prepare` at image build time
+PREPARED_STAMP = '.ben_prepared.json'
+PATCHED_FILES = ['bba/BBA.py', 'sample.py', 'botbidder.py', 'config/default.conf']
+
+def _patch_fingerprint():
+    """Hash of the patched Ben files as they are on disk now"""
+    import hashlib
+    h = hashlib.sha256()
+    for path in PATCHED_FILES:
+        h.update(path.encode())
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+def _is_prepared():
+    """True if --prepare already patched and verified exactly these files"""
+    import json
+    try:
+        with open(PREPARED_STAMP, 'r') as f:
+            return json.load(f).get('fingerprint') == _patch_fingerprint()
+    except (OSError, ValueError):
+        return False
+
+def verify_patched_files():
+    """Check the patched files; returns a list of problems (empty if all good)"""
+    errors = []
+    
+    if os.path.exists('bba/BBA.py'):
+        with open('bba/BBA.py', 'r') as f:
+            if 'Mock BBA' in f.read():
+                print("✅ BBA.py patch verified")
+            else:
+                errors.append("BBA.py patch failed")
+    
+    for path in ['sample.py', 'botbidder.py']:
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, 'r') as f:
+                compile(f.read(), path, 'exec')
+            print(f"✅ {path} syntax OK")
+        except SyntaxError as e:
+            errors.append(f"{path} syntax error: {e}")
+    
+    config = 'config/default.conf'
+    if os.path.exists(config):
+        from configparser import ConfigParser
+        try:
+            ConfigParser().read(config)
+            print("✅ default.conf parses")
+        except Exception as e:
+            errors.append(f"default.conf: {e}")
+    
+    return errors
+
+# With several workers the supervisor patches once; workers inherit the flag.
+# Images built with --prepare ship pre-patched files and skip this entirely.
+if os.environ.get('BEN_FILES_PATCHED') != '1':
+    if _is_prepared():
+        print("Ben files already prepared - skipping patch")
+    else:
+        print("Patching Ben files...")
+        patch_files()
+        print("Done patching!")
+    os.environ['BEN_FILES_PATCHED'] = '1'
 
 # ============================================================
 # STEP 3: IMPORT AND RUN API
 # ============================================================
 
+import copy
+import functools
+import gc
+import hashlib
+import hmac
+import html
+import importlib
+import inspect
+import json
 import logging
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import random
+import sqlite3
+import struct
+import urllib.parse
+import urllib.request
+import uuid
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, PrivateAttr
+from string import Template
 from typing import List, Optional
 import asyncio
+import contextvars
+import numpy as np
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Serving processes; each worker loads its own full copy of the models (weights
+# are not shared, so RSS grows with N) and gets an equal share of the cores for
+# TF intra-op parallelism
+WORKERS = int(os.environ.get('BEN_WORKERS', '1'))
+TF_INTRA_OP_THREADS = int(os.environ.get('BEN_TF_INTRA_OP_THREADS', '0')) or max(1, (os.cpu_count() or 1) // WORKERS)
+
+# Inference executor: analyses running at once per worker, how many more may
+# wait for a slot before requests are rejected with 429, and TF inter-op
+# threads (one per concurrently running analysis by default)
+INFERENCE_WORKERS = max(1, int(os.environ.get('BEN_INFERENCE_WORKERS', '4')))
+MAX_QUEUE = max(0, int(os.environ.get('BEN_MAX_QUEUE', '16')))
+TF_INTER_OP_THREADS = int(os.environ.get('BEN_TF_INTER_OP_THREADS', '0')) or INFERENCE_WORKERS
+
+# Micro-batching: how long a NN call may wait for others to join its batch,
+# and the largest batch (in rows) sent to a model in one call
+BATCH_MAX_WAIT_MS = float(os.environ.get('BEN_BATCH_MAX_WAIT_MS', '5'))
+BATCH_MAX_SIZE = int(os.environ.get('BEN_BATCH_MAX_SIZE', '256'))
+
+# Result cache: entries kept in memory (0 disables) and optional directory
+# for a persistent on-disk tier
+CACHE_SIZE = int(os.environ.get('BEN_CACHE_SIZE', '1024'))
+CACHE_DIR = os.environ.get('BEN_CACHE_DIR') or None
+
+# Warm-up: set BEN_WARMUP=0 to skip; batch sizes default to every padded
+# size the batcher can produce (powers of two up to BEN_BATCH_MAX_SIZE)
+WARMUP = os.environ.get('BEN_WARMUP', '1') != '0'
+WARMUP_BATCH_SIZES = [int(b) for b in os.environ.get('BEN_WARMUP_BATCH_SIZES', '').split(',') if b.strip()]
+
+# Incremental play: number of deals whose per-step analysis state is kept
+DEAL_STATES = int(os.environ.get('BEN_DEAL_STATES', '256'))
+
+# Sampled layouts kept per deal and shared between its card decisions (0 disables)
+SAMPLE_MEMO_SIZE = int(os.environ.get('BEN_SAMPLE_MEMO_SIZE', '64'))
+
+# Rendered /analyze/html pages kept in memory, keyed by analysis-result hash
+HTML_CACHE_SIZE = int(os.environ.get('BEN_HTML_CACHE_SIZE', '256'))
+
+# Inference runtime: 'keras' (default) or 'tflite' to serve TFLite conversions
+# of the networks (float32 'none', float16, dynamic-range int8 or full int8),
+# built at --prepare into BEN_TFLITE_DIR and only used where they agree with
+# Keras on the reference deals. Accepted conversions load without Keras.
+RUNTIME = os.environ.get('BEN_RUNTIME', 'keras')
+TFLITE_QUANT = os.environ.get('BEN_TFLITE_QUANT', 'float16')
+TFLITE_DIR = os.environ.get('BEN_TFLITE_DIR', 'tflite')
+TFLITE_MIN_AGREEMENT = float(os.environ.get('BEN_TFLITE_MIN_AGREEMENT', '0.98'))
+
+# --prepare times a cold start in a fresh process and fails the build if it
+# takes longer than this (railway.json's healthcheck timeout is set above it)
+STARTUP_BUDGET_SECONDS = float(os.environ.get('BEN_STARTUP_BUDGET_SECONDS', '60'))
+
+# Async jobs: SQLite file holding the durable job queue, analyses run at once
+# from it per worker, and how long finished jobs are kept
+JOBS_DB = os.environ.get('BEN_JOBS_DB', 'jobs.sqlite3')
+JOB_WORKERS = max(1, int(os.environ.get('BEN_JOB_WORKERS', '2')))
+JOB_RETENTION_HOURS = float(os.environ.get('BEN_JOB_RETENTION_HOURS', '168'))
+# A running job holds a lease its process renews; jobs whose lease runs out
+# (the process died) are requeued
+JOB_LEASE_SECONDS = float(os.environ.get('BEN_JOB_LEASE_SECONDS', '60'))
+# Hosts job webhooks may be sent to (comma-separated; '.example.com' covers
+# its subdomains). Any other host needs the admin token
+JOB_WEBHOOK_HOSTS = tuple(h.strip().lower() for h in os.environ.get('BEN_JOB_WEBHOOK_HOSTS', '').split(',')
+                          if h.strip())
+
+# Precomputed opening bids built by precompute_openings.py (used if present
+# and built with the same models)
+OPENING_INDEX_DIR = os.environ.get('BEN_OPENING_INDEX', 'opening_index')
+
+# Lazy loading: BEN_LAZY_MODELS=1 loads each network the first time an
+# analysis needs it (bidding-only traffic never loads the play models), and
+# BEN_MODEL_IDLE_SECONDS > 0 unloads networks unused for that long
+LAZY_MODELS = os.environ.get('BEN_LAZY_MODELS', '0') == '1'
+MODEL_IDLE_SECONDS = float(os.environ.get('BEN_MODEL_IDLE_SECONDS', '0'))
+
+# Analysis depth tiers selectable per request. Each maps to a sample-count
+# factor, sampler/models setting overrides and the analyses it runs; BEN_TIERS
+# (JSON, same shape) overrides or adds tiers
+_ANALYSES = ('bidding', 'play')
+_DEFAULT_TIERS = {
+    "fast": {"samples": 0.25, "analyses": ["bidding"],
+             "models": {"pimc_use_declaring": False, "pimc_use_defending": False}},
+    "standard": {},
+    "thorough": {"samples": 2.0},
+}
+TIERS_JSON = os.environ.get('BEN_TIERS') or None
+TIER_NAMES = frozenset(_DEFAULT_TIERS) | frozenset(json.loads(TIERS_JSON) if TIERS_JSON else ())
+
+# Deadlines: BEN_DEADLINE_MS > 0 caps every online analysis (a request may ask
+# for less with deadline_ms). Past its deadline an analysis stops before the
+# next bid or card and returns the evaluations done so far, flagged partial
+DEADLINE_MS = max(0, int(os.environ.get('BEN_DEADLINE_MS', '0')))
+
+# Admin endpoints (profiling) are only enabled when a token is configured
+ADMIN_TOKEN = os.environ.get('BEN_ADMIN_TOKEN') or None
+
 # Global state
 models = None
 CardByCard = None
 sampler = None
+model_version = None
+
+# ------------------------------------------------------------
+# Compact deal representation (parsed once at the API boundary)
+# ------------------------------------------------------------
+
+_SEATS = 'NESW'
+_SUITS = 'SHDC'
+_RANKS = 'AKQJT98765432'
+# Card code = suit * 13 + rank index (SA = 0 ... C2 = 51); hand masks use bit `code`
+_CARD_CODES = {s + r: i * 13 + j for i, s in enumerate(_SUITS) for j, r in enumerate(_RANKS)}
+_CARDS = sorted(_CARD_CODES, key=_CARD_CODES.get)
+# Call code: 0 PASS, 1 X, 2 XX, then 1C..7N
+_CALLS = ['PASS', 'X', 'XX'] + [f"{level}{strain}" for level in range(1, 8) for strain in 'CDHSN']
+_CALL_CODES = {call: i for i, call in enumerate(_CALLS)}
+_CALL_CODES.update({'P': 0, 'D': 1, 'DBL': 1, 'R': 2, 'RDBL': 2})
+_CALL_CODES.update({f"{level}NT": _CALL_CODES[f"{level}N"] for level in range(1, 8)})
+
+
+def _parse_hand(hand):
+    """52-bit card mask of a 13-card hand string (ValueError if invalid)"""
+    suits = hand.split('.')
+    if len(suits) != 4:
+        raise ValueError(f"hand must have 4 suits separated by '.': {hand!r}")
+    mask = 0
+    for suit, ranks in zip(_SUITS, suits):
+        for rank in ranks.upper():
+            code = _CARD_CODES.get(suit + rank)
+            if code is None or mask >> code & 1:
+                raise ValueError(f"bad or repeated card {suit}{rank} in {hand!r}")
+            mask |= 1 << code
+    if bin(mask).count('1') != 13:
+        raise ValueError(f"hand must have 13 cards: {hand!r}")
+    return mask
+
+
+def _hand_string(mask):
+    """Hand string of a card mask, ranks in order"""
+    return '.'.join(''.join(r for j, r in enumerate(_RANKS) if mask >> (i * 13 + j) & 1) for i in range(4))
+
+
+class Deal:
+    """
+    One deal as masks and byte codes: 52-bit card mask per hand (N, E, S, W),
+    uint8 call and card codes. Built once per request; keys, Ben's input
+    strings and the binary format all come from it.
+    """
+    __slots__ = ('dealer', 'vuln', 'hands', 'auction', 'play')
+
+    def __init__(self, dealer, vuln, hands, auction, play):
+        self.dealer = dealer
+        self.vuln = vuln
+        self.hands = hands
+        self.auction = auction
+        self.play = play
+
+    @classmethod
+    def parse(cls, dealer, vuln, hands, auction, play):
+        """Validate and encode a deal given in the JSON request format (ValueError if invalid)"""
+        if dealer not in tuple(_SEATS):
+            raise ValueError(f"dealer must be one of N, E, S, W: {dealer!r}")
+        if len(vuln) != 2:
+            raise ValueError("vuln must be [ns, ew]")
+        if len(hands) != 4:
+            raise ValueError("hands must list N, E, S and W")
+        masks = [_parse_hand(hand) for hand in hands]
+        if masks[0] & masks[1] or masks[2] & masks[3] or (masks[0] | masks[1]) & (masks[2] | masks[3]):
+            raise ValueError("a card appears in more than one hand")
+        try:
+            calls = bytes(_CALL_CODES[call.upper()] for call in auction)
+        except KeyError as e:
+            raise ValueError(f"unknown call {e.args[0]!r}")
+        try:
+            cards = bytes(_CARD_CODES[card.upper()] for card in play)
+        except KeyError as e:
+            raise ValueError(f"unknown card {e.args[0]!r}")
+        if len(set(cards)) != len(cards):
+            raise ValueError("a card is played twice")
+        return cls(_SEATS.index(dealer), (bool(vuln[0]), bool(vuln[1])), tuple(masks), calls, cards)
+
+    @classmethod
+    def from_compact(cls, data):
+        """Inverse of to_compact() (the msgpack request format)"""
+        if int(data['dealer']) not in range(4):
+            raise ValueError(f"dealer must be 0-3: {data['dealer']!r}")
+        deal = cls(int(data['dealer']), (bool(data['vuln'] & 1), bool(data['vuln'] & 2)),
+                   tuple(int(m) for m in data['hands']), bytes(data['auction']), bytes(data.get('play', b'')))
+        # Round-trip through the checks of parse()
+        return cls.parse(*deal.strings())
+
+    def to_compact(self):
+        return {'dealer': self.dealer, 'vuln': self.vuln[0] | self.vuln[1] << 1,
+                'hands': list(self.hands), 'auction': self.auction, 'play': self.play}
+
+    def hand_strings(self):
+        return [_hand_string(mask) for mask in self.hands]
+
+    def strings(self):
+        """(dealer, vuln, hands, auction, play) as Ben takes them"""
+        return (_SEATS[self.dealer], list(self.vuln), self.hand_strings(),
+                [_CALLS[c] for c in self.auction], [_CARDS[c] for c in self.play])
+
+    def key_bytes(self, with_play=True):
+        """Fixed-layout binary form; equal deals give equal bytes"""
+        head = struct.pack('<BB4Q', self.dealer, self.vuln[0] | self.vuln[1] << 1, *self.hands)
+        tail = bytes([len(self.auction)]) + self.auction
+        if with_play:
+            tail += bytes([len(self.play)]) + self.play
+        return head + tail
+
 
 class AnalysisRequest(BaseModel):
     dealer: str
@@ -216,95 +518,3233 @@ class AnalysisRequest(BaseModel):
     hands: List[str]
     auction: List[str]
     play: Optional[List[str]] = []
+    tier: str = "standard"
+    deadline_ms: Optional[int] = None
+    _deal: Optional[Deal] = PrivateAttr(default=None)
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    global models, CardByCard, sampler
-    logger.info("🔄 Loading Ben neural network models...")
-    
+    def deal(self) -> Deal:
+        """The request as a Deal, parsed on first use (ValueError if the deal, tier or deadline is invalid)"""
+        if self.tier not in TIER_NAMES:
+            raise ValueError(f"tier must be one of {sorted(TIER_NAMES)}")
+        if self.deadline_ms is not None and self.deadline_ms <= 0:
+            raise ValueError("deadline_ms must be positive")
+        if self._deal is None:
+            self._deal = Deal.parse(self.dealer, self.vuln, self.hands, self.auction, self.play or [])
+        return self._deal
+
+    @classmethod
+    def from_deal(cls, deal: Deal, tier="standard", deadline_ms=None):
+        dealer, vuln, hands, auction, play = deal.strings()
+        request = cls(dealer=dealer, vuln=vuln, hands=hands, auction=auction, play=play, tier=tier,
+                      deadline_ms=deadline_ms)
+        request._deal = deal
+        return request
+
+class BatchAnalysisRequest(BaseModel):
+    deals: List[AnalysisRequest]
+
+class JobRequest(BaseModel):
+    deal: AnalysisRequest
+    webhook: Optional[str] = None
+
+class BatchJobRequest(BaseModel):
+    deals: List[AnalysisRequest]
+    webhook: Optional[str] = None
+
+class ProgressiveRequest(BaseModel):
+    hand: str
+    auction: Optional[List[str]] = []
+    seat: int = 0
+    dealer: int = 0
+    vuln_ns: bool = False
+    vuln_ew: bool = False
+
+# ------------------------------------------------------------
+# Metrics (Prometheus text format, served on /metrics)
+# ------------------------------------------------------------
+
+# Seconds buckets cover 1 ms model calls up to minute-long full analyses
+_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_ROWS_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+def _label_str(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, values)) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name, help, buckets, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for labels, (counts, count, total) in sorted(series.items()):
+            for bound, n in zip(self.buckets, counts):
+                le = _label_str(self.labelnames + ('le',), labels + (f"{bound:g}",))
+                lines.append(f"{self.name}_bucket{le} {n}")
+            lines.append(f"{self.name}_bucket{_label_str(self.labelnames + ('le',), labels + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, labels)} {count}")
+        return lines
+
+
+def _sample_lines(name, help, kind, samples):
+    """Exposition lines for a gauge/counter from [(labels dict, value)]"""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_label_str(tuple(labels), tuple(labels.values()))} {value}")
+    return lines
+
+
+# Where analysis time goes: parse, construct, bid, card, sampling, serialize,
+# analysis (whole CardByCard run), progressive, render. bid/card include the
+# sampling and model calls they make.
+STAGE_SECONDS = Histogram('ben_stage_seconds', 'Time spent per analysis pipeline stage',
+                          _SECONDS_BUCKETS, ('stage',))
+MODEL_CALL_SECONDS = Histogram('ben_model_call_seconds', 'Forward-pass time per (merged) model call',
+                               _SECONDS_BUCKETS, ('model',))
+MODEL_BATCH_ROWS = Histogram('ben_model_batch_rows', 'Rows per (merged) model call, before padding',
+                             _ROWS_BUCKETS, ('model',))
+TIER_SECONDS = Histogram('ben_tier_analysis_seconds', 'Computed analysis time per depth tier',
+                         _SECONDS_BUCKETS, ('tier',))
+
+# Result-cache lookups per (tier, hit/miss)
+_tier_lookups = {}
+_tier_lookups_lock = threading.Lock()
+
+
+def _count_tier_lookup(tier, hit):
+    with _tier_lookups_lock:
+        key = (tier, "hit" if hit else "miss")
+        _tier_lookups[key] = _tier_lookups.get(key, 0) + 1
+
+# Analyses cut short by their deadline, per stage they stopped before (bid/card)
+_partial_results = {}
+_partial_results_lock = threading.Lock()
+
+
+def _count_partial(stage):
+    with _partial_results_lock:
+        _partial_results[stage] = _partial_results.get(stage, 0) + 1
+
+# Wall time from the request reaching the app to the handler starting (body parsing)
+_request_start = contextvars.ContextVar('ben_request_start', default=None)
+
+
+def observe_parse():
+    """Record the request-parsing stage; call first thing in a handler"""
+    start = _request_start.get()
+    if start is not None:
+        STAGE_SECONDS.observe(time.perf_counter() - start, 'parse')
+
+# ------------------------------------------------------------
+# Sampling profiler (admin only; idle unless armed)
+# ------------------------------------------------------------
+
+def _frame_label(frame):
+    """Folded-stack label for a frame; model calls become '[model <name>]' pseudo-frames"""
+    code = frame.f_code
+    if code is _DISPATCH_CODE:
+        owner = frame.f_locals.get('self')
+        return f"[model {getattr(owner, '_name', '?')}]"
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Profile:
+    """Folded stacks sampled from the thread(s) running one analysis"""
+
+    def __init__(self, profile_id, label, interval):
+        self.id = profile_id
+        self.label = label
+        self.interval = interval
+        self.started = time.time()
+        self.seconds = None
+        self.samples = {}
+
+    def add(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        folded = ';'.join(reversed(stack))
+        self.samples[folded] = self.samples.get(folded, 0) + 1
+
+    def folded(self):
+        """Brendan Gregg folded format (flamegraph.pl, speedscope, inferno)"""
+        return ''.join(f"{stack} {n}\n" for stack, n in sorted(self.samples.items()))
+
+    def summary(self):
+        return {"id": self.id, "label": self.label, "interval_ms": self.interval * 1000,
+                "samples": sum(self.samples.values()), "seconds": self.seconds}
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of profiled analysis threads every `interval`.
+
+    Nothing runs until a profile is requested: arm(n) profiles the next n
+    analyses, or a single request can ask for one. The sampler thread exits as
+    soon as no profiled analysis is running.
+    """
+
+    def __init__(self, keep=16):
+        self._lock = threading.Lock()
+        self._armed = 0
+        self._interval = 0.005
+        self._active = {}
+        self._done = OrderedDict()
+        self._keep = keep
+        self._next_id = 1
+        self._thread = None
+
+    def arm(self, calls, interval_ms=5.0):
+        with self._lock:
+            self._armed = max(0, calls)
+            self._interval = max(interval_ms, 0.5) / 1000.0
+            return self._armed
+
+    def claim(self, label, forced=False):
+        """Return a new _Profile if this analysis should be profiled, else None"""
+        if not forced and not self._armed:
+            return None
+        with self._lock:
+            if not forced:
+                if not self._armed:
+                    return None
+                self._armed -= 1
+            profile = _Profile(f"p{self._next_id}", label, self._interval)
+            self._next_id += 1
+            return profile
+
+    def run(self, profile, fn, *args):
+        """Call fn(*args) on this thread while sampling its stack into profile"""
+        tid = threading.get_ident()
+        start = time.perf_counter()
+        with self._lock:
+            self._active[tid] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="ben-profiler", daemon=True)
+                self._thread.start()
+        try:
+            return fn(*args)
+        finally:
+            profile.seconds = round(time.perf_counter() - start, 4)
+            with self._lock:
+                self._active.pop(tid, None)
+                self._done[profile.id] = profile
+                while len(self._done) > self._keep:
+                    self._done.popitem(last=False)
+
+    def _loop(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = dict(self._active)
+                interval = min(p.interval for p in active.values())
+            frames = sys._current_frames()
+            for tid, profile in active.items():
+                if tid != me and tid in frames:
+                    profile.add(frames[tid])
+            del frames
+            time.sleep(interval)
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._done.get(profile_id)
+
+    def list(self):
+        with self._lock:
+            return {"armed": self._armed, "running": len(self._active),
+                    "profiles": [p.summary() for p in self._done.values()]}
+
+
+profiler = SamplingProfiler()
+
+# ============================================================
+# STEP 4: BATCHED MODEL CALLS
+# ============================================================
+
+# Batcher the current analysis thread submits its forward passes to (if any)
+_batch_local = threading.local()
+
+
+def _flatten(value):
+    """Flatten nested lists/tuples/dicts of arrays into a list of leaves"""
+    if isinstance(value, (list, tuple)):
+        return [leaf for v in value for leaf in _flatten(v)]
+    if isinstance(value, dict):
+        return [leaf for k in value for leaf in _flatten(value[k])]
+    return [value]
+
+
+def _unflatten(template, leaves):
+    """Inverse of _flatten: rebuild the structure of template from leaves"""
+    it = iter(leaves)
+
+    def build(t):
+        if isinstance(t, list):
+            return [build(v) for v in t]
+        if isinstance(t, tuple):
+            return tuple(build(v) for v in t)
+        if isinstance(t, dict):
+            return {k: build(t[k]) for k in t}
+        return next(it)
+
+    return build(template)
+
+
+def _to_numpy(value):
+    """Convert a tf.Tensor (or anything array-like) to a numpy array"""
+    if hasattr(value, 'numpy'):
+        return value.numpy()
+    return np.asarray(value)
+
+
+def _like(template, value):
+    """Return value as a tensor if template was a tensor, else as an array"""
+    if hasattr(template, 'numpy'):
+        import tensorflow as tf
+        return tf.convert_to_tensor(value)
+    return value
+
+
+class _ModelCall:
+    """One forward pass waiting to be merged into a batch"""
+    __slots__ = ('proxy', 'method', 'x', 'leaves', 'args', 'kwargs',
+                 'key', 'rows', 'result', 'error', 'done')
+
+    def __init__(self, proxy, method, x, args, kwargs):
+        self.proxy = proxy
+        self.method = method
+        self.x = x
+        self.leaves = [_to_numpy(leaf) for leaf in _flatten(x)]
+        self.args = args
+        self.kwargs = kwargs
+        self.key = (
+            id(proxy), method,
+            tuple((a.shape[1:], a.dtype.str) for a in self.leaves),
+            repr(args), repr(sorted(kwargs.items())),
+        )
+        self.rows = self.leaves[0].shape[0] if self.leaves and self.leaves[0].ndim else 0
+        self.result = None
+        self.error = None
+        self.done = False
+
+
+def _run_single(call):
+    model = call.proxy._model
+    return getattr(model, call.method)(call.x, *call.args, **call.kwargs)
+
+
+def _bucket(rows):
+    """Round a batch size up to the next power of two so TF sees few distinct shapes"""
+    size = 1
+    while size < rows:
+        size *= 2
+    return min(size, max(BATCH_MAX_SIZE, rows))
+
+
+def _run_group(calls):
+    """Run calls that share a model and input signature as one padded forward pass"""
     try:
-        # The file is models_tf2.py, not models.py
-        from nn.models_tf2 import Models
-        from analysis import CardByCard as CBC
-        from sample import Sample
-        
-        CardByCard = CBC
-        
-        from configparser import ConfigParser
-        conf = ConfigParser()
-        conf.read('config/default.conf')
-        
-        logger.info("🧠 Loading models...")
-        models = Models.from_conf(conf, '..')  # Models are in /app/ben/models, we're in /app/ben/src
-        
-        # Create sampler
-        sampler = Sample.from_conf(conf, '..')
-        
-        logger.info("✅ Models loaded!")
-        
+        rows = sum(c.rows for c in calls)
+        padded = _bucket(rows)
+        if not calls[0].rows or (len(calls) == 1 and padded == rows):
+            for call in calls:
+                call.result = _run_single(call)
+            return
+
+        first = calls[0]
+        merged = []
+        for column in zip(*(c.leaves for c in calls)):
+            if padded > rows:
+                column = column + (np.zeros((padded - rows,) + column[0].shape[1:], column[0].dtype),)
+            merged.append(np.concatenate(column, axis=0))
+        model = first.proxy._model
+        out = getattr(model, first.method)(_unflatten(first.x, merged), *first.args, **first.kwargs)
+
+        templates = _flatten(out)
+        outputs = [_to_numpy(t) for t in templates]
+        if any(o.ndim == 0 or o.shape[0] != padded for o in outputs):
+            # Output is not batch-major - fall back to one call per request
+            for call in calls:
+                call.result = _run_single(call)
+            return
+
+        start = 0
+        for call in calls:
+            stop = start + call.rows
+            call.result = _unflatten(out, [_like(t, o[start:stop]) for t, o in zip(templates, outputs)])
+            start = stop
     except Exception as e:
-        logger.error(f"❌ Load error: {e}")
-        import traceback
-        traceback.print_exc()
-    
-    yield
+        for call in calls:
+            call.error = e
 
-app = FastAPI(
-    title="Ben Bridge Analysis API",
-    description="Neural network only - no DDS/BBA",
-    version="2.0",
-    lifespan=lifespan
-)
 
-@app.get("/")
-def root():
-    return {"service": "Ben NN API", "status": "ready" if models else "loading"}
+def _split_rows(calls, limit):
+    """Split a group of calls into chunks of at most `limit` rows (at least one call each)"""
+    chunk, rows = [], 0
+    for call in calls:
+        if chunk and rows + call.rows > limit:
+            yield chunk
+            chunk, rows = [], 0
+        chunk.append(call)
+        rows += call.rows
+    if chunk:
+        yield chunk
 
-@app.get("/health")
-def health():
-    return {"status": "healthy", "models": models is not None}
 
-@app.post("/analyze")
-async def analyze(request: AnalysisRequest):
-    if not models:
-        raise HTTPException(503, "Models not loaded")
-    
+class ModelBatcher:
+    """
+    Micro-batching scheduler shared by every in-flight analysis.
+
+    Analysis threads submit forward passes and block. Pending calls are flushed
+    when every live participant is waiting, when the oldest call has waited
+    `max_wait_ms`, or when `max_batch` rows are queued. On flush, calls are
+    grouped per model and input signature, padded to a power-of-two batch and
+    run as one call per group; each caller gets back its own rows.
+    """
+
+    def __init__(self, max_wait_ms=5.0, max_batch=256):
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._pending = []
+        self._pending_rows = 0
+        self._oldest = None
+        self._participants = 0
+        self._stats = {"flushes": 0, "model_calls": 0, "requests": 0, "rows": 0, "max_rows": 0}
+
+    def reserve(self, n):
+        """Count n participants that are about to start (see participate(reserved=True))"""
+        with self._cond:
+            self._participants += n
+
+    @contextmanager
+    def participate(self, reserved=False):
+        """Register the calling thread as an analysis that feeds this batcher"""
+        if not reserved:
+            with self._cond:
+                self._participants += 1
+        _batch_local.batcher = self
+        try:
+            yield
+        finally:
+            _batch_local.batcher = None
+            with self._cond:
+                self._participants -= 1
+                ready = self._take_ready()
+            self._execute(ready)
+
+    def submit(self, proxy, method, x, args, kwargs):
+        call = _ModelCall(proxy, method, x, args, kwargs)
+        with self._cond:
+            self._pending.append(call)
+            self._pending_rows += call.rows
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+        while True:
+            with self._cond:
+                if call.done:
+                    break
+                ready = self._take_ready()
+                if not ready:
+                    if self._oldest is not None:
+                        timeout = max(self._oldest + self.max_wait - time.monotonic(), 0.0)
+                    else:
+                        timeout = None
+                    self._cond.wait(timeout)
+                    continue
+            self._execute(ready)
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, participants=self._participants, pending=len(self._pending))
+
+    def _take_ready(self):
+        if not self._pending:
+            return []
+        if (len(self._pending) < self._participants
+                and self._pending_rows < self.max_batch
+                and time.monotonic() - self._oldest < self.max_wait):
+            return []
+        ready, self._pending = self._pending, []
+        self._pending_rows = 0
+        self._oldest = None
+        return ready
+
+    def _execute(self, calls):
+        if not calls:
+            return
+        groups = {}
+        for call in calls:
+            groups.setdefault(call.key, []).append(call)
+        n_calls = 0
+        for group in groups.values():
+            name = group[0].proxy._name
+            for chunk in _split_rows(group, self.max_batch):
+                MODEL_BATCH_ROWS.observe(sum(c.rows for c in chunk), name)
+                with MODEL_CALL_SECONDS.time(name):
+                    _run_group(chunk)
+                n_calls += 1
+        with self._cond:
+            rows = sum(c.rows for c in calls)
+            self._stats["flushes"] += 1
+            self._stats["model_calls"] += n_calls
+            self._stats["requests"] += len(calls)
+            self._stats["rows"] += rows
+            self._stats["max_rows"] = max(self._stats["max_rows"], rows)
+            for call in calls:
+                call.done = True
+            self._cond.notify_all()
+
+
+# Process-wide scheduler that every analysis submits its NN calls to
+batcher = ModelBatcher(BATCH_MAX_WAIT_MS, BATCH_MAX_SIZE)
+
+
+class BatchedModel:
+    """Stand-in for a Keras model that routes forward passes through a ModelBatcher"""
+
+    def __init__(self, name, model):
+        self._name = name
+        self._model = model
+
+    def __call__(self, x, *args, **kwargs):
+        return self._dispatch('__call__', x, args, kwargs)
+
+    def predict(self, x, *args, **kwargs):
+        return self._dispatch('predict', x, args, kwargs)
+
+    def predict_on_batch(self, x, *args, **kwargs):
+        return self._dispatch('predict_on_batch', x, args, kwargs)
+
+    def _dispatch(self, method, x, args, kwargs):
+        batcher = getattr(_batch_local, 'batcher', None)
+        if batcher is not None:
+            try:
+                return batcher.submit(self, method, x, args, kwargs)
+            except (TypeError, ValueError, AttributeError, NotImplementedError) as e:
+                # Symbolic tensors (e.g. inside tf.function) can't be merged
+                logger.debug(f"Unbatched {self._name}.{method}: {e}")
+        with MODEL_CALL_SECONDS.time(self._name):
+            return getattr(self._model, method)(x, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+# Code object of BatchedModel._dispatch, which the profiler renders as a model pseudo-frame
+_DISPATCH_CODE = BatchedModel._dispatch.__code__
+
+
+def _iter_nn_models(root):
+    """Yield (name, owner) for every object on Ben's Models holding a Keras `.model`"""
+    for attr, value in list(vars(root).items()):
+        if isinstance(value, (list, tuple)):
+            items = [(f"{attr}[{i}]", v) for i, v in enumerate(value)]
+        else:
+            items = [(attr, value)]
+        for name, owner in items:
+            model = getattr(owner, 'model', None)
+            if model is not None and hasattr(model, 'get_weights'):
+                yield name, owner
+
+
+def install_model_batching(root):
+    """Wrap every Keras model on Ben's Models in a BatchedModel"""
+    names = []
+    for name, owner in _iter_nn_models(root):
+        if not isinstance(owner.model, BatchedModel):
+            owner.model = BatchedModel(name, owner.model)
+        names.append(name)
+    return names
+
+# ------------------------------------------------------------
+# Lazy model loading
+# ------------------------------------------------------------
+
+# Keras entry points Ben may load networks through
+_LOAD_FUNCTIONS = ('keras.models.load_model', 'keras.saving.load_model', 'tensorflow.keras.models.load_model')
+_loading_local = threading.local()
+
+
+def _rss_bytes():
+    """Current resident set size of this process (Linux), or None"""
     try:
-        logger.info("🎴 Analyzing...")
-        
-        cbc = CardByCard(
-            dealer=request.dealer,
-            vuln=request.vuln,
-            hands=request.hands,
-            auction=request.auction,
-            play=request.play or [],
-            models=models,
-            sampler=sampler,
-            verbose=False
-        )
-        
-        # Run analysis in thread pool
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, cbc.analyze)
-        
-        # Build response
-        result = {"status": "success", "bidding": [], "play": []}
-        
-        if hasattr(cbc, 'bid_analysis'):
-            result["bidding"] = cbc.bid_analysis
-        
-        if hasattr(cbc, 'play_analysis'):
-            result["play"] = cbc.play_analysis
-            
-        logger.info("✅ Done!")
-        return result
-        
-    except Exception as e:
-        logger.error(f"❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(500, str(e))
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
 
-if __name__ == "__main__":
+
+class LazyNetwork:
+    """
+    Keras model that loads the first time it is used.
+
+    Returned by Keras' load_model while Models.from_conf runs, so Ben's
+    objects hold it as their `.model`. It records load time, weight bytes and
+    the RSS growth the load caused. Once idle it can be unloaded, unless code
+    has reached into the model (any attribute besides the input/output specs),
+    since that code may still hold a reference.
+    """
+
+    def __init__(self, loader, args, kwargs):
+        self.name = os.path.basename(str(args[0] if args else kwargs.get('filepath', 'model')))
+        self._loader = loader
+        self._args = args
+        self._kwargs = kwargs
+        self._model = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self.warm_on_load = False
+        self.pinned = False
+        self.loads = 0
+        self.calls = 0
+        self.load_seconds = None
+        self.weight_bytes = None
+        self.rss_delta_bytes = None
+        self.last_used = None
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        with self._lock:
+            return self._load_locked()
+
+    def _load_locked(self):
+        if self._model is not None:
+            return self._model
+        rss, start = _rss_bytes(), time.monotonic()
+        model = self._loader(*self._args, **self._kwargs)
+        if self.warm_on_load:
+            for size in _warmup_batch_sizes():
+                model(_synthetic_inputs(model, size), training=False)
+        self.load_seconds = round(time.monotonic() - start, 3)
+        self.weight_bytes = getattr(model, 'weight_bytes', None) or sum(
+            int(getattr(w, 'nbytes', 0)) for w in model.get_weights())
+        after = _rss_bytes()
+        self.rss_delta_bytes = after - rss if rss is not None and after is not None else None
+        self.loads += 1
+        self.last_used = time.monotonic()
+        self._model = model
+        logger.info(f"🧠 Loaded {self.name} in {self.load_seconds}s ({self.weight_bytes / 2**20:.1f} MiB weights)")
+        return model
+
+    @contextmanager
+    def _use(self):
+        with self._lock:
+            model = self._load_locked()
+            self._active += 1
+            self.calls += 1
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._active -= 1
+                self.last_used = time.monotonic()
+
+    def __call__(self, x, *args, **kwargs):
+        with self._use() as model:
+            return model(x, *args, **kwargs)
+
+    def predict(self, x, *args, **kwargs):
+        with self._use() as model:
+            return model.predict(x, *args, **kwargs)
+
+    def predict_on_batch(self, x, *args, **kwargs):
+        with self._use() as model:
+            return model.predict_on_batch(x, *args, **kwargs)
+
+    def get_weights(self):
+        with self._use() as model:
+            return model.get_weights()
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        model = self.load()
+        if name not in ('inputs', 'outputs'):
+            self.pinned = True
+        return getattr(model, name)
+
+    def unload(self):
+        """Drop the model if nothing is using or holding it; True if it was dropped"""
+        with self._lock:
+            if self._model is None or self._active or self.pinned:
+                return False
+            self._model = None
+        gc.collect()
+        logger.info(f"💤 Unloaded {self.name}")
+        return True
+
+    def idle_seconds(self):
+        return None if self.last_used is None else time.monotonic() - self.last_used
+
+    def report(self):
+        idle = self.idle_seconds()
+        return {"name": self.name, "loaded": self.loaded, "loads": self.loads, "calls": self.calls,
+                "load_seconds": self.load_seconds, "weight_mb": _mb(self.weight_bytes),
+                "rss_delta_mb": _mb(self.rss_delta_bytes), "idle_seconds": None if idle is None else round(idle, 1),
+                "pinned": self.pinned}
+
+
+def _mb(n):
+    return None if n is None else round(n / 2**20, 1)
+
+
+def _resolve(dotted):
+    """(owner object, attribute) for 'package.module.attr', or None if unavailable"""
+    path, _, attr = dotted.rpartition('.')
+    top, *rest = path.split('.')
+    try:
+        owner = importlib.import_module(top)
+        for part in rest:
+            owner = getattr(owner, part)
+    except (ImportError, AttributeError):
+        return None
+    return (owner, attr) if hasattr(owner, attr) else None
+
+
+def _deferring_loader(original):
+    """load_model that returns a LazyNetwork inside deferred_loading(), else loads as usual"""
+    @functools.wraps(original)
+    def load_model(*args, **kwargs):
+        registry = getattr(_loading_local, 'networks', None)
+        if registry is None:
+            return original(*args, **kwargs)
+        network = LazyNetwork(original, args, kwargs)
+        registry.append(network)
+        return network
+    load_model._ben_original = original
+    return load_model
+
+
+def install_deferred_loading():
+    """Wrap Keras' load_model entry points; must run before Ben's modules import them"""
+    patched = []
+    for dotted in _LOAD_FUNCTIONS:
+        found = _resolve(dotted)
+        if found is None or hasattr(getattr(*found), '_ben_original'):
+            continue
+        setattr(found[0], found[1], _deferring_loader(getattr(*found)))
+        patched.append(dotted)
+    return patched
+
+
+@contextmanager
+def deferred_loading():
+    """Collect (instead of load) every network load_model is asked for"""
+    _loading_local.networks = networks = []
+    try:
+        yield networks
+    finally:
+        _loading_local.networks = None
+
+
+def _evict_idle_networks(idle_seconds):
+    while True:
+        time.sleep(max(1.0, idle_seconds / 4))
+        for network in list(networks):
+            idle = network.idle_seconds()
+            if network.loaded and idle is not None and idle > idle_seconds:
+                network.unload()
+
+
+# Every network Models.from_conf asked for, in load order
+networks = []
+
+# ------------------------------------------------------------
+# Inference executor
+# ------------------------------------------------------------
+
+class InferenceSaturated(HTTPException):
+    """Raised when every worker is busy and the admission queue is full (HTTP 429)"""
+
+    def __init__(self, retry_after):
+        super().__init__(429, "Server busy, retry later", headers={"Retry-After": str(retry_after)})
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for analyses.
+
+    At most `workers` analyses run at once and at most `max_queue` more wait
+    for a slot. Anything beyond that is rejected straight away with
+    InferenceSaturated, whose Retry-After is estimated from recent run times.
+    """
+
+    def __init__(self, workers=4, max_queue=16):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ben-inference')
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self._avg_seconds = 1.0
+        self._stats = {"completed": 0, "rejected": 0}
+
+    def acquire(self, n=1):
+        """Admit n jobs at once or raise InferenceSaturated; each must then be submit()ed"""
+        with self._lock:
+            if self._admitted + n > self.workers + self.max_queue:
+                raise self._saturated(n)
+            self._admitted += n
+
+    def _saturated(self, n):
+        """InferenceSaturated for n rejected jobs; call with the lock held"""
+        self._stats["rejected"] += n
+        queued = max(self._admitted - self.workers, 0)
+        return InferenceSaturated(max(1, int(self._avg_seconds * (queued + 1) / self.workers + 0.999)))
+
+    def acquire_up_to(self, n):
+        """
+        Admit as many of n jobs as there is room for (InferenceSaturated if
+        none) and return that count. The slots are held across any number of
+        submit(held=True) calls until release()d.
+        """
+        with self._lock:
+            room = self.workers + self.max_queue - self._admitted
+            if room <= 0 and n > 0:
+                raise self._saturated(n)
+            admitted = max(min(n, room), 0)
+            self._admitted += admitted
+            return admitted
+
+    def release(self, n):
+        with self._lock:
+            self._admitted -= n
+
+    def submit(self, fn, *args, acquired=False, held=False):
+        """Run fn(*args) on the pool; returns an awaitable for the running loop"""
+        if not acquired and not held:
+            self.acquire()
+        return asyncio.get_event_loop().run_in_executor(self._pool, self._run, fn, args, held)
+
+    def _run(self, fn, args, held=False):
+        start = time.monotonic()
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._running -= 1
+                if not held:
+                    self._admitted -= 1
+                self._stats["completed"] += 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, workers=self.workers, max_queue=self.max_queue, running=self._running,
+                        queued=max(self._admitted - self._running, 0),
+                        avg_seconds=round(self._avg_seconds, 3))
+
+
+# Every analysis runs here rather than in the event loop's default executor
+inference = InferenceExecutor(INFERENCE_WORKERS, MAX_QUEUE)
+
+# ------------------------------------------------------------
+# Quantized TFLite runtime (BEN_RUNTIME=tflite)
+# ------------------------------------------------------------
+
+_TFLITE_QUANTS = ('none', 'float16', 'dynamic', 'int8')
+
+# Input/output spec of a network, as stored in the TFLite manifest
+_TensorSpec = namedtuple('_TensorSpec', 'name shape dtype')
+
+
+def _tensor_specs(tensors):
+    return [_TensorSpec(getattr(t, 'name', '') or '', [None if d is None else int(d) for d in tuple(t.shape)],
+                        str(getattr(t.dtype, 'name', t.dtype) or 'float32')) for t in tensors]
+
+
+def _natural_key(name):
+    """Sort key putting output_2 before output_10"""
+    import re
+    return [int(t) if t.isdigit() else t for t in re.split(r'(\d+)', name)]
+
+
+def _interpreter_class():
+    """Standalone tflite_runtime when installed, else the interpreter bundled with TF"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteNetwork:
+    """
+    Drop-in for a Keras model backed by a TFLite flatbuffer.
+
+    Interpreters are not thread-safe, so each thread gets its own; the
+    signature runner resizes inputs to whatever batch it is given. `inputs`
+    and `outputs` are the original Keras specs (used by warm-up). Built from
+    a file path, the interpreters map the file instead of copying it.
+    """
+
+    def __init__(self, name, inputs, outputs, content=None, path=None):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self._content = content
+        self._path = path
+        self._local = threading.local()
+        self._input_names = [getattr(t, 'name', '').split(':')[0] for t in inputs]
+        runner = self._runner()
+        keys = list(runner.get_input_details())
+        self._input_keys = []
+        for i, name in enumerate(self._input_names):
+            match = [k for k in keys if name and (k == name or k.endswith(name))]
+            self._input_keys.append(match[0] if match else keys[i])
+
+    @classmethod
+    def from_keras(cls, name, content, keras_model):
+        return cls(name, _tensor_specs(keras_model.inputs), _tensor_specs(keras_model.outputs), content=content)
+
+    @classmethod
+    def from_manifest(cls, name, out_dir, entry):
+        """The converted network alone, from its manifest entry; Keras is never loaded"""
+        return cls(name, [_TensorSpec(*spec) for spec in entry["inputs"]],
+                   [_TensorSpec(*spec) for spec in entry["outputs"]], path=os.path.join(out_dir, entry["file"]))
+
+    def _runner(self):
+        runner = getattr(self._local, 'runner', None)
+        if runner is None:
+            if self._path is not None:
+                interpreter = _interpreter_class()(model_path=self._path)
+            else:
+                interpreter = _interpreter_class()(model_content=self._content)
+            runner = self._local.runner = interpreter.get_signature_runner()
+        return runner
+
+    def _forward(self, x):
+        leaves = [_to_numpy(leaf).astype(np.float32, copy=False) for leaf in _flatten(x)]
+        out = self._runner()(**dict(zip(self._input_keys, leaves)))
+        outputs = [out[k] for k in sorted(out, key=_natural_key)]
+        return outputs[0] if len(outputs) == 1 else outputs
+
+    def __call__(self, x, training=False, **kwargs):
+        import tensorflow as tf
+        out = self._forward(x)
+        if isinstance(out, list):
+            return [tf.convert_to_tensor(o) for o in out]
+        return tf.convert_to_tensor(out)
+
+    def predict(self, x, *args, **kwargs):
+        return self._forward(x)
+
+    def predict_on_batch(self, x, *args, **kwargs):
+        return self._forward(x)
+
+    def get_weights(self):
+        return []
+
+    @property
+    def weight_bytes(self):
+        """Size of the flatbuffer, weights included"""
+        return os.path.getsize(self._path) if self._path is not None else len(self._content)
+
+
+class _InputRecorder:
+    """Wraps a Keras model and keeps (a bounded number of) the inputs it sees"""
+
+    def __init__(self, model, limit=64):
+        self._model = model
+        self.samples = []
+        self.limit = limit
+
+    def _keep(self, x):
+        if len(self.samples) < self.limit:
+            self.samples.append([_to_numpy(leaf) for leaf in _flatten(x)])
+
+    def __call__(self, x, *args, **kwargs):
+        self._keep(x)
+        return self._model(x, *args, **kwargs)
+
+    def predict(self, x, *args, **kwargs):
+        self._keep(x)
+        return self._model.predict(x, *args, **kwargs)
+
+    def predict_on_batch(self, x, *args, **kwargs):
+        self._keep(x)
+        return self._model.predict_on_batch(x, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+def _reference_deals():
+    """Fixed deal set for calibration and the accuracy check: warm-up deal + bench corpus"""
+    deals = [_WARMUP_DEAL]
+    corpus = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench', 'corpus.jsonl')
+    if os.path.exists(corpus):
+        with open(corpus) as f:
+            deals += [AnalysisRequest(**json.loads(line)) for line in f if line.strip()]
+    return deals
+
+
+def record_network_inputs(root, deals):
+    """Run deals with the Keras networks and return {name: [input leaves, ...]}"""
+    recorders = {}
+    for name, owner in _iter_nn_models(root):
+        recorders[name] = _InputRecorder(owner.model._model)
+        owner.model._model = recorders[name]
+    try:
+        for deal in deals:
+            try:
+                _analyze_deal(deal)
+            except Exception as e:
+                logger.warning(f"Reference deal failed: {e}")
+    finally:
+        for name, owner in _iter_nn_models(root):
+            owner.model._model = recorders[name]._model
+        deal_states.clear()
+    return {name: r.samples for name, r in recorders.items()}
+
+
+def convert_to_tflite(model, quant, samples):
+    """Convert a Keras model to a TFLite flatbuffer with the given quantization"""
+    import tensorflow as tf
+    import tempfile
+
+    def configure(converter):
+        if quant != 'none':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quant == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        elif quant == 'int8':
+            def representative():
+                for leaves in samples:
+                    for row in range(leaves[0].shape[0]):
+                        yield [leaf[row:row + 1].astype(np.float32) for leaf in leaves]
+            converter.representative_dataset = representative
+        # Recurrent layers may need TF ops that have no builtin TFLite kernel
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+        return converter.convert()
+
+    try:
+        return configure(tf.lite.TFLiteConverter.from_keras_model(model))
+    except Exception as e:
+        # Keras 3 models convert more reliably through an exported SavedModel
+        logger.info(f"from_keras_model failed ({e}); converting via SavedModel")
+        with tempfile.TemporaryDirectory() as tmp:
+            model.export(tmp, format='tf_saved_model')
+            return configure(tf.lite.TFLiteConverter.from_saved_model(tmp))
+
+
+def _random_inputs(model, batch_size):
+    """Seeded standard-normal input leaves matching a Keras model's input specs"""
+    rng = np.random.default_rng(0)
+    return [rng.standard_normal(leaf.shape).astype(leaf.dtype) if leaf.dtype.kind == 'f' else leaf
+            for leaf in _flatten(_synthetic_inputs(model, batch_size))]
+
+
+def check_accuracy(keras_model, network, samples):
+    """Compare TFLite outputs with full precision: max |diff| and argmax agreement"""
+    max_diff, agree, rows = 0.0, 0, 0
+    for leaves in samples:
+        x = leaves[0] if len(leaves) == 1 else leaves
+        ref = [_to_numpy(o) for o in _flatten(keras_model(x, training=False))]
+        out = [_to_numpy(o) for o in _flatten(network.predict(x))]
+        for r, o in zip(ref, out):
+            max_diff = max(max_diff, float(np.max(np.abs(r.astype(np.float32) - o))) if r.size else 0.0)
+            agree += int(np.sum(np.argmax(r, axis=-1) == np.argmax(o, axis=-1)))
+            rows += int(np.prod(r.shape[:-1])) if r.ndim else 1
+    return {"rows": rows, "max_abs_diff": round(max_diff, 6),
+            "argmax_agreement": round(agree / rows, 4) if rows else None}
+
+
+def build_tflite(root, out_dir, quant):
+    """Convert every network, check it against Keras and write a manifest"""
+    if quant not in _TFLITE_QUANTS:
+        raise ValueError(f"BEN_TFLITE_QUANT must be one of {_TFLITE_QUANTS}")
+    os.makedirs(out_dir, exist_ok=True)
+    logger.info(f"🗜️ Converting networks to TFLite ({quant})...")
+    samples = record_network_inputs(root, _reference_deals())
+    manifest = {"model_version": model_version, "quant": quant, "networks": {}}
+    for name, owner in _iter_nn_models(root):
+        keras_model = owner.model._model
+        entry = manifest["networks"][name] = {"accepted": False}
+        if not samples.get(name):
+            if quant == 'int8':
+                entry["error"] = "not used by the reference deals, which int8 calibrates on"
+                continue
+            # Checked on seeded random inputs instead, so it too loads from the conversion
+            samples[name] = [_random_inputs(keras_model, 16)]
+            entry["random_inputs"] = True
+        try:
+            content = convert_to_tflite(keras_model, quant, samples[name])
+            entry.update(check_accuracy(keras_model, TFLiteNetwork.from_keras(name, content, keras_model), samples[name]))
+        except Exception as e:
+            entry["error"] = str(e)
+            logger.warning(f"TFLite {name}: {e}")
+            continue
+        path = os.path.join(out_dir, f"{name}.tflite")
+        with open(path, 'wb') as f:
+            f.write(content)
+        entry.update(file=os.path.basename(path), bytes=len(content), inputs=_tensor_specs(keras_model.inputs),
+                     outputs=_tensor_specs(keras_model.outputs),
+                     accepted=bool(entry["argmax_agreement"] is not None
+                                   and entry["argmax_agreement"] >= TFLITE_MIN_AGREEMENT))
+        logger.info(f"   {name}: {len(content) // 1024} KiB, agreement {entry['argmax_agreement']}, "
+                    f"max diff {entry['max_abs_diff']}{'' if entry['accepted'] else ' (rejected)'}")
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _tflite_manifest(out_dir=TFLITE_DIR, quant=TFLITE_QUANT):
+    """The conversion manifest if it was built for these models and quantization, else None"""
+    try:
+        with open(os.path.join(out_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("model_version") != model_version or manifest.get("quant") != quant:
+        return None
+    return manifest
+
+
+def _artifact_loader(name, out_dir, entry):
+    """load_model stand-in returning the converted network (the Keras arguments are ignored)"""
+    def load(*args, **kwargs):
+        return TFLiteNetwork.from_manifest(name, out_dir, entry)
+    return load
+
+
+def tflite_loaders(requested, out_dir=TFLITE_DIR, quant=TFLITE_QUANT):
+    """
+    Point every network with an accepted conversion in a current manifest at
+    its .tflite file, before anything loads, so its Keras model is never
+    loaded. Returns their names.
+    """
+    manifest = _tflite_manifest(out_dir, quant)
+    if manifest is None:
+        return []
+    served = []
+    for network in requested:
+        entry = manifest["networks"].get(network.name, {})
+        if entry.get("accepted") and entry.get("inputs") is not None:
+            network._loader = _artifact_loader(network.name, out_dir, entry)
+            served.append(network.name)
+    return served
+
+
+def install_tflite(root, out_dir=TFLITE_DIR, quant=TFLITE_QUANT):
+    """Serve every accepted TFLite network in place of its Keras model (building them if needed)"""
+    manifest = _tflite_manifest(out_dir, quant) or build_tflite(root, out_dir, quant)
+    installed = []
+    for name, owner in _iter_nn_models(root):
+        entry = manifest["networks"].get(name, {})
+        if not entry.get("accepted"):
+            continue
+        with open(os.path.join(out_dir, entry["file"]), 'rb') as f:
+            owner.model._model = TFLiteNetwork.from_keras(name, f.read(), owner.model._model)
+        installed.append(name)
+    return installed
+
+# ============================================================
+# STEP 5: RESULT CACHE
+# ============================================================
+
+def _plain(value):
+    """Copy of value with numpy scalars/arrays turned into Python ones (what a JSON round trip gives)"""
+    if isinstance(value, dict):
+        return {k if isinstance(k, str) else str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return value
+    return _plain(_json_default(value))
+
+
+def _json_default(value):
+    """json.dumps fallback for numpy values in analysis results"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _model_version(conf_path):
+    """Fingerprint of the model configuration; part of every cache key"""
+    h = hashlib.sha256(os.environ.get('BEN_MODEL_VERSION', '').encode())
+    if RUNTIME != 'keras':
+        h.update(f"{RUNTIME}:{TFLITE_QUANT}".encode())
+    if os.path.exists(conf_path):
+        with open(conf_path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def _cache_key(request: AnalysisRequest):
+    """Canonical content hash of a deal plus the model version (and tier, if not standard)"""
+    payload = f"{model_version}|".encode() + _tier_namespace(request) + request.deal().key_bytes()
+    return hashlib.sha256(payload).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of analysis results.
+
+    A bounded in-memory LRU sits in front of an optional directory of JSON
+    files (one per key) that survives restarts. Disk hits are promoted back
+    into memory.
+    """
+
+    def __init__(self, max_entries=1024, disk_dir=None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_errors": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or bool(self.disk_dir)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return value
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+        self._write_disk(key, value)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), max_entries=self.max_entries,
+                        disk_dir=self.disk_dir)
+
+    def _remember(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + '.json')
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cache read failed for {key}: {e}")
+            self._stats["disk_errors"] += 1
+            return None
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'w') as f:
+                json.dump(value, f, default=_json_default)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
+            self._stats["disk_errors"] += 1
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+result_cache = ResultCache(CACHE_SIZE, CACHE_DIR)
+
+# ------------------------------------------------------------
+# Single-flight request coalescing
+# ------------------------------------------------------------
+
+class SingleFlight:
+    """
+    At most one running computation per key.
+
+    The first caller for a key starts the work; callers arriving while it runs
+    await the same future and get the same result (or exception). Shielded, so
+    one client disconnecting does not cancel the others. Event-loop thread only.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._stats = {"started": 0, "coalesced": 0}
+
+    def join(self, key, start):
+        """Awaitable result for key: the in-flight one, or start() (an awaitable factory) shared from now on"""
+        future = self._flights.get(key)
+        if future is not None:
+            self._stats["coalesced"] += 1
+            return asyncio.shield(future)
+        future = asyncio.ensure_future(start())
+        self._flights[key] = future
+        self._stats["started"] += 1
+        future.add_done_callback(lambda f: self._land(key, f))
+        return asyncio.shield(future)
+
+    def active(self, key):
+        return key in self._flights
+
+    def _land(self, key, future):
+        if self._flights.get(key) is future:
+            del self._flights[key]
+        if not future.cancelled():
+            future.exception()  # retrieved, even if every waiter went away
+
+    def stats(self):
+        return dict(self._stats, in_flight=len(self._flights))
+
+
+in_flight = SingleFlight()
+
+# ============================================================
+# STEP 6: INCREMENTAL PLAY ANALYSIS
+# ============================================================
+
+# Bot entry points whose results are recorded per deal and replayed when a
+# later request only extends the play. Each call is one bid or card decision,
+# timed under the given ben_stage_seconds stage when computed afresh.
+_REPLAY_TARGETS = [
+    ('botbidder', 'BotBid', 'bid', 'bid'),
+    ('botopeninglead', 'BotLead', 'find_opening_lead', 'card'),
+    ('botcardplayer', 'CardPlayer', 'play_card', 'card'),
+]
+
+# Replay session and deadline (perf_counter time) of the analysis running on
+# the current thread (if any)
+_replay_local = threading.local()
+
+
+class _DeadlineExceeded(Exception):
+    """Raised in place of the next bid/card decision once the analysis is out of time"""
+
+    def __init__(self, stage):
+        super().__init__(f"deadline passed before the next {stage}")
+        self.stage = stage
+
+
+def _check_deadline(stage):
+    deadline = getattr(_replay_local, 'deadline', None)
+    if deadline is not None and time.perf_counter() >= deadline:
+        raise _DeadlineExceeded(stage)
+
+
+class _ObservedList(list):
+    """list that notifies its observers after every append/extend"""
+
+    def __init__(self, items, observers):
+        super().__init__(items)
+        self.observers = observers
+
+    def append(self, item):
+        super().append(item)
+        for observer in self.observers:
+            observer(item)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+
+def _observe(cbc, attr, observer):
+    """Call observer(item) whenever CardByCard appends to cbc.<attr>"""
+    current = getattr(cbc, attr, None)
+    if isinstance(current, _ObservedList):
+        current.observers.append(observer)
+    elif isinstance(current, list):
+        setattr(cbc, attr, _ObservedList(current, [observer]))
+
+
+class _StepSession:
+    """Replays recorded bot decisions, then records the ones computed afresh"""
+
+    def __init__(self, replay, samples=None):
+        self.replay = replay
+        self.samples = samples if samples is not None else _SampleMemo(SAMPLE_MEMO_SIZE)
+        self.steps = []
+        self.bid_marks = []
+        self.card_marks = []
+
+    def next_step(self):
+        """Return (True, value) while recorded steps remain, else (False, None)"""
+        i = len(self.steps)
+        if i < len(self.replay):
+            return True, self.replay[i]
+        return False, None
+
+    def record(self, value):
+        self.steps.append(value)
+
+    def mark_bid(self, _):
+        self.bid_marks.append(len(self.steps))
+
+    def mark_card(self, _):
+        self.card_marks.append(len(self.steps))
+
+
+class _DealState:
+    """Recorded bot decisions for one deal and the play they cover"""
+    __slots__ = ('play', 'steps', 'bid_marks', 'card_marks', 'samples')
+
+    def __init__(self, play, session):
+        self.play = list(play)
+        self.samples = session.samples
+        self.steps = session.steps
+        self.bid_marks = session.bid_marks
+        self.card_marks = session.card_marks
+
+    def replay_for(self, play):
+        """Steps that can be reused for a request with the given play"""
+        common = 0
+        for old, new in zip(self.play, play):
+            if old != new:
+                break
+            common += 1
+        common = min(common, len(self.card_marks))
+        if common:
+            return self.steps[:self.card_marks[common - 1]]
+        return self.steps[:self.bid_marks[-1]] if self.bid_marks else []
+
+
+class DealStateStore:
+    """LRU of _DealState keyed by deal (everything except the play)"""
+
+    def __init__(self, max_deals=256):
+        self.max_deals = max_deals
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"replayed_steps": 0, "computed_steps": 0}
+
+    def session(self, key, play):
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+        if state is None:
+            return _StepSession([])
+        return _StepSession(state.replay_for(play), state.samples)
+
+    def save(self, key, play, session):
+        replayed = min(len(session.replay), len(session.steps))
+        with self._lock:
+            self._stats["replayed_steps"] += replayed
+            self._stats["computed_steps"] += len(session.steps) - replayed
+            if self.max_deals <= 0:
+                return
+            # Only the cards actually analyzed count: a run cut short by its
+            # deadline covers less of the play than it asked for
+            covered = list(play[:len(session.card_marks)])
+            old = self._states.get(key)
+            # Keep the longer history when a client steps back through the play
+            if (old is not None and old.play[:len(covered)] == covered
+                    and len(session.steps) <= len(old.steps)):
+                return
+            self._states[key] = _DealState(covered, session)
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_deals:
+                self._states.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, deals=len(self._states), max_deals=self.max_deals)
+
+
+def _replayable(fn, stage):
+    """Wrap a bot method so it takes part in the current thread's _StepSession"""
+    if inspect.iscoroutinefunction(fn):
+        async def wrapper(*args, **kwargs):
+            session = getattr(_replay_local, 'session', None)
+            found, value = session.next_step() if session is not None else (False, None)
+            if not found:
+                _check_deadline(stage)
+                with STAGE_SECONDS.time(stage):
+                    value = await fn(*args, **kwargs)
+            if session is not None:
+                session.record(value)
+            return value
+    else:
+        def wrapper(*args, **kwargs):
+            session = getattr(_replay_local, 'session', None)
+            found, value = session.next_step() if session is not None else (False, None)
+            if not found:
+                _check_deadline(stage)
+                with STAGE_SECONDS.time(stage):
+                    value = fn(*args, **kwargs)
+            if session is not None:
+                session.record(value)
+            return value
+    wrapper.__wrapped__ = fn
+    wrapper._ben_replayable = True
+    return wrapper
+
+
+def install_step_replay():
+    """Wrap Ben's bot entry points so analyses can resume from a play prefix"""
+    import importlib
+    installed = []
+    for module_name, class_name, method, stage in _REPLAY_TARGETS:
+        try:
+            cls = getattr(importlib.import_module(module_name), class_name)
+            fn = getattr(cls, method)
+        except (ImportError, AttributeError) as e:
+            logger.warning(f"Incremental analysis: {module_name}.{class_name}.{method} unavailable ({e})")
+            continue
+        if not getattr(fn, '_ben_replayable', False):
+            setattr(cls, method, _replayable(fn, stage))
+        installed.append(f"{class_name}.{method}")
+    return installed
+
+
+# Sampler entry points whose layouts are shared between the decisions of one
+# deal. Their arguments carry the auction and the cards seen so far, so two
+# calls with equal arguments want the same layouts.
+_SAMPLER_METHODS = ('sample_cards_vec', 'sample_cards_auction', 'shuffle_cards_bidding_info',
+                    'init_rollout_states', 'get_bidding_info')
+
+
+# Arguments keyed only by type: the RNG (sharing its draws is the point) and
+# the models, fixed for a deal's memo (which is per tier). Any other object
+# could carry position state, so a call passing one is not memoized.
+_COLLAPSED_TYPES = (np.random.Generator, np.random.RandomState, random.Random)
+_COLLAPSED_TYPE_NAMES = ('Models',)
+_COLLAPSED_KWARGS = ('rng', 'models')
+
+
+class _Unkeyable(Exception):
+    pass
+
+
+def _sample_key_part(value):
+    """Hashable digest of one sampler argument (_Unkeyable for objects it can't see into)"""
+    if isinstance(value, np.ndarray):
+        return ('nd', value.dtype.str, value.shape, hashlib.sha1(np.ascontiguousarray(value).data).hexdigest())
+    if isinstance(value, (str, int, float, bool, type(None), np.generic)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_sample_key_part(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _sample_key_part(v)) for k, v in value.items()))
+    if isinstance(value, _COLLAPSED_TYPES) or type(value).__name__ in _COLLAPSED_TYPE_NAMES:
+        return type(value).__name__
+    raise _Unkeyable(type(value).__name__)
+
+
+def _sample_key(name, args, kwargs):
+    kwargs = tuple(sorted((k, type(v).__name__ if k in _COLLAPSED_KWARGS else _sample_key_part(v))
+                          for k, v in kwargs.items()))
+    return name, _sample_key_part(args), kwargs
+
+
+def _copy_sample(value):
+    """Copy arrays out of a memoized result so callers can't modify the shared one"""
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copy_sample(v) for v in value)
+    if isinstance(value, list):
+        return [_copy_sample(v) for v in value]
+    return value
+
+
+class _SampleMemo:
+    """LRU of sampler results for one deal, shared by all its requests"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, self._entries[key]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SharedSampler:
+    """
+    Proxy around Ben's Sample that memoizes layout sampling per deal.
+
+    Ben draws layouts as whole arrays already, but every bid and card decision
+    redraws them from scratch; consecutive cards of a deal mostly ask for the
+    same auction-consistent layouts. Outside an analysis session (or for
+    methods not in _SAMPLER_METHODS) calls go straight to the sampler.
+    """
+
+    def __init__(self, sampler):
+        self._sampler = sampler
+        self._stats = {"hits": 0, "misses": 0, "unkeyable": 0}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._sampler, name)
+        if name not in _SAMPLER_METHODS or not callable(attr):
+            return attr
+        if inspect.iscoroutinefunction(attr):
+            async def call(*args, **kwargs):
+                memo, key = self._lookup(name, args, kwargs)
+                found, value = memo.get(key) if memo else (False, None)
+                if not found:
+                    with STAGE_SECONDS.time('sampling'):
+                        value = await attr(*args, **kwargs)
+                    if memo:
+                        memo.put(key, value)
+                self._count(found)
+                return _copy_sample(value)
+        else:
+            def call(*args, **kwargs):
+                memo, key = self._lookup(name, args, kwargs)
+                found, value = memo.get(key) if memo else (False, None)
+                if not found:
+                    with STAGE_SECONDS.time('sampling'):
+                        value = attr(*args, **kwargs)
+                    if memo:
+                        memo.put(key, value)
+                self._count(found)
+                return _copy_sample(value)
+        return call
+
+    def _lookup(self, name, args, kwargs):
+        session = getattr(_replay_local, 'session', None)
+        if session is None or session.samples.max_entries <= 0:
+            return None, None
+        try:
+            return session.samples, _sample_key(name, args, kwargs)
+        except _Unkeyable:
+            # Still counted as a miss as well
+            with self._lock:
+                self._stats["unkeyable"] += 1
+            return None, None
+
+    def _count(self, hit):
+        with self._lock:
+            self._stats["hits" if hit else "misses"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, max_entries_per_deal=SAMPLE_MEMO_SIZE)
+
+
+def _deal_key(request: AnalysisRequest):
+    """Hash of everything that determines the analysis except the play"""
+    payload = f"{model_version}|".encode() + _tier_namespace(request) + request.deal().key_bytes(with_play=False)
+    return hashlib.sha256(payload).hexdigest()
+
+# ------------------------------------------------------------
+# Analysis depth tiers
+# ------------------------------------------------------------
+
+def _tier_specs():
+    """Tier definitions: defaults overlaid with BEN_TIERS (JSON, same shape)"""
+    specs = {name: dict(spec) for name, spec in _DEFAULT_TIERS.items()}
+    if TIERS_JSON:
+        for name, spec in json.loads(TIERS_JSON).items():
+            specs[name] = dict(specs.get(name, {}), **spec)
+    for name, spec in specs.items():
+        analyses = set(spec.get("analyses", _ANALYSES))
+        if "bidding" not in analyses or not analyses <= set(_ANALYSES):
+            raise ValueError(f"tier {name}: analyses must include 'bidding' and be a subset of {_ANALYSES}")
+    return specs
+
+
+def _scaled_copy(obj, factor, overrides, name):
+    """Shallow copy of Ben's Sample/Models with sample counts scaled and attributes overridden"""
+    clone = copy.copy(obj)
+    if factor != 1:
+        for attr, value in vars(obj).items():
+            if 'sample' in attr and isinstance(value, int) and not isinstance(value, bool):
+                setattr(clone, attr, max(1, int(round(value * factor))))
+    for attr, value in overrides.items():
+        if hasattr(obj, attr):
+            setattr(clone, attr, value)
+        else:
+            logger.warning(f"Tier {name}: {type(obj).__name__} has no setting {attr!r}; ignored")
+    return clone
+
+
+class Tier:
+    """Models/sampler a tier analyzes with, and which analyses it runs (sharing the loaded networks)"""
+
+    def __init__(self, name, spec, base_models, base_sampler):
+        self.name = name
+        self.analyses = tuple(a for a in _ANALYSES if a in spec.get("analyses", _ANALYSES))
+        if name == 'standard' and not spec:
+            self.models, self.sampler = base_models, base_sampler
+        else:
+            self.models = _scaled_copy(base_models, 1, spec.get("models", {}), name)
+            self.sampler = SharedSampler(_scaled_copy(base_sampler._sampler, spec.get("samples", 1),
+                                                      spec.get("sampler", {}), name))
+
+    @property
+    def skipped(self):
+        return [a for a in _ANALYSES if a not in self.analyses]
+
+
+def build_tiers(base_models, base_sampler):
+    return {name: Tier(name, spec, base_models, base_sampler) for name, spec in _tier_specs().items()}
+
+
+def _tier_namespace(request: AnalysisRequest):
+    """Key prefix of a request's tier; standard keeps the original, unprefixed keys"""
+    return b'' if request.tier == 'standard' else f"{request.tier}|".encode()
+
+
+# Name -> Tier, filled by load_models()
+tiers = {}
+
+
+deal_states = DealStateStore(DEAL_STATES)
+
+# ============================================================
+# STEP 7: WARM-UP AND READINESS
+# ============================================================
+
+# Synthetic deal pushed through the whole analysis path during warm-up
+_WARMUP_DEAL = AnalysisRequest(
+    dealer='N',
+    vuln=[False, False],
+    hands=['AKQJ.AKQ.AKQ.AKQ', 'T987.JT9.JT9.JT9', '65.8765.8765.876', '432.432.432.5432'],
+    auction=['1C', 'PASS', '1H', 'PASS', '3N', 'PASS', 'PASS', 'PASS'],
+    play=['ST', 'S6', 'S2', 'SA'],
+)
+
+# loading -> warming -> ready (or failed); /health is only 200 once ready
+readiness = {"state": "loading", "load_seconds": None, "warmup_seconds": None,
+             "deal_seconds": None, "startup_seconds": None, "models": {}}
+
+
+def _warmup_batch_sizes():
+    if WARMUP_BATCH_SIZES:
+        return sorted(set(WARMUP_BATCH_SIZES))
+    sizes, size = [], 1
+    while size <= BATCH_MAX_SIZE:
+        sizes.append(size)
+        size *= 2
+    return sizes
+
+
+def _synthetic_inputs(model, batch_size):
+    """Zero inputs matching a Keras model's input specs (unknown dims -> 1)"""
+    arrays = []
+    for spec in model.inputs:
+        shape = [batch_size] + [d if d is not None else 1 for d in tuple(spec.shape)[1:]]
+        dtype = getattr(spec.dtype, 'name', spec.dtype) or 'float32'
+        arrays.append(np.zeros(shape, dtype=dtype))
+    return arrays[0] if len(arrays) == 1 else arrays
+
+
+def warm_up_models(root, batch_sizes):
+    """Run every network once per batch size so TF traces and picks kernels up front"""
+    timings = {}
+    for name, owner in _iter_nn_models(root):
+        model = owner.model._model if isinstance(owner.model, BatchedModel) else owner.model
+        if isinstance(model, LazyNetwork) and not model.loaded:
+            continue  # warmed when it loads
+        timings[name] = {}
+        for size in batch_sizes:
+            start = time.time()
+            try:
+                model(_synthetic_inputs(model, size), training=False)
+            except Exception as e:
+                logger.warning(f"Warm-up of {name} at batch {size} failed: {e}")
+                timings[name][size] = None
+                break
+            timings[name][size] = round((time.time() - start) * 1000, 1)
+    return timings
+
+# ============================================================
+# STEP 8: PROGRESSIVE CARD REVEAL
+# ============================================================
+
+def _reveal_prefixes(hand):
+    """Partial hands after each card of `hand` is revealed, in PBN suit order (ValueError if not a valid hand)"""
+    _parse_hand(hand)
+    suits = hand.split('.')
+    prefixes = []
+    for s, suit in enumerate(suits):
+        for n in range(1, len(suit) + 1):
+            prefixes.append('.'.join(suits[:s] + [suit[:n]] + [''] * (3 - s)))
+    return prefixes
+
+
+def _new_bot_bid(request: ProgressiveRequest, hand):
+    """BotBid for `hand`, filling constructor arguments by name"""
+    from botbidder import BotBid
+    known = {
+        'vuln': [request.vuln_ns, request.vuln_ew],
+        'hand_str': hand,
+        'hand': hand,
+        'models': models,
+        'sampler': sampler,
+        'seat': request.seat,
+        'dealer': request.dealer,
+        'ddsolver': dd_solver.DDSolver(),
+        'bba_is_controlling': False,
+        'verbose': False,
+    }
+    kwargs = {}
+    for name, param in inspect.signature(BotBid).parameters.items():
+        if name in known:
+            kwargs[name] = known[name]
+        elif param.default is inspect.Parameter.empty and param.kind not in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            raise TypeError(f"BotBid needs unsupported argument {name!r}")
+    return BotBid(**kwargs)
+
+
+def _bid_and_confidence(resp):
+    """(bid, confidence) of a BidResp; confidence is the chosen call's NN score"""
+    d = _step_dict(resp)
+    bid = d.get('bid', d.get('value'))
+    for candidate in d.get('candidates') or []:
+        if candidate.get('call', candidate.get('bid')) == bid:
+            return bid, candidate.get('insta_score')
+    return bid, d.get('insta_score', d.get('p'))
+
+
+def _reveal_bid(request: ProgressiveRequest, hand, auction):
+    with batcher.participate(reserved=True):
+        bot = _new_bot_bid(request, hand)
+        pending = bot.bid(auction)
+        if asyncio.iscoroutine(pending):
+            pending = asyncio.run(pending)
+    return _bid_and_confidence(pending)
+
+
+def analyze_progressive(request: ProgressiveRequest):
+    """Recommended bid after each revealed card, all 13 bidders evaluated in one batch"""
+    prefixes = _reveal_prefixes(request.hand)
+    # Ben's auctions start at North, padded up to the dealer
+    auction = ['PAD_START'] * request.dealer + list(request.auction or [])
+    # One bidder per revealed-card count on threads of this request's own, all
+    # running at once so the batcher stacks their encodings into a single
+    # forward pass of each network. They are reserved up front so the first
+    # ones don't flush before the rest arrive.
+    batcher.reserve(len(prefixes))
+    with ThreadPoolExecutor(max_workers=len(prefixes), thread_name_prefix='ben-reveal') as pool:
+        bids = list(pool.map(lambda hand: _reveal_bid(request, hand, auction), prefixes))
+    return _progressive_summary(request, prefixes, bids)
+
+
+def _progressive_summary(request: ProgressiveRequest, prefixes, bids):
+    """Progressive result from the (bid, confidence) after each revealed card"""
+    steps = [{"cards_shown": hand, "num_cards": i + 1, "recommended_bid": bid, "confidence": confidence}
+             for i, (hand, (bid, confidence)) in enumerate(zip(prefixes, bids))]
+    changes = [{"at_card": cur["num_cards"], "from_bid": prev["recommended_bid"],
+                "to_bid": cur["recommended_bid"], "cards_shown": cur["cards_shown"]}
+               for prev, cur in zip(steps, steps[1:]) if prev["recommended_bid"] != cur["recommended_bid"]]
+    final = steps[-1] if steps else {"recommended_bid": None, "confidence": None}
+    return {
+        "full_hand": request.hand,
+        "auction": list(request.auction or []),
+        "seat": request.seat,
+        "dealer": request.dealer,
+        "analysis_steps": steps,
+        "summary": {
+            "total_cards": len(steps),
+            "final_recommendation": final["recommended_bid"],
+            "final_confidence": final["confidence"],
+            "bid_changes": changes,
+            "num_changes": len(changes),
+        },
+    }
+
+def _progressive_key(request: ProgressiveRequest):
+    """Canonical content hash of a progressive request plus the model version"""
+    payload = json.dumps([model_version, "progressive", request.hand, list(request.auction or []),
+                          request.seat, request.dealer, request.vuln_ns, request.vuln_ew],
+                         separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _progressive_cached(request: ProgressiveRequest):
+    """Like _cached() for progressive requests"""
+    if not result_cache.enabled:
+        return None, None
+    key = _progressive_key(request)
+    return key, result_cache.get(key)
+
+
+def _run_progressive(request: ProgressiveRequest, key=None):
+    with STAGE_SECONDS.time('progressive'):
+        result = analyze_progressive(request)
+    if key is not None:
+        result_cache.put(key, result)
+    return result
+
+# ------------------------------------------------------------
+# Precomputed opening bids
+# ------------------------------------------------------------
+
+def _opening_slot(request: ProgressiveRequest):
+    """
+    Index key of an opening-bid request, or None if it isn't one. The key is
+    the hand mask with the passes so far and vulnerability seen from the
+    bidder's side; Ben encodes the auction relative to the bidder, so requests
+    that differ only by a rotation of the table share a key. Suits are not
+    normalized (their rank order matters to the auction). The hand must be
+    written in rank order, which fixes the reveal order.
+    """
+    auction = list(request.auction or [])
+    if len(auction) > 3 or any(call != 'PASS' for call in auction):
+        return None
+    try:
+        mask = _parse_hand(request.hand)
+    except ValueError:
+        return None
+    if _hand_string(mask) != request.hand:
+        return None
+    we, they = (request.vuln_ns, request.vuln_ew) if request.seat % 2 == 0 else (request.vuln_ew, request.vuln_ns)
+    return mask << 4 | len(auction) << 2 | int(we) << 1 | int(they)
+
+
+def _opening_request(slot):
+    """The request an index slot stands for, with the bidder sitting North"""
+    passes = slot >> 2 & 3
+    return ProgressiveRequest(hand=_hand_string(slot >> 4), auction=['PASS'] * passes, seat=0,
+                              dealer=(4 - passes) % 4, vuln_ns=bool(slot & 2), vuln_ew=bool(slot & 1))
+
+
+class OpeningIndex:
+    """
+    Progressive analyses of opening-bid requests computed offline.
+
+    Stored as three .npy arrays (sorted uint64 slot keys, uint8 call codes and
+    float32 confidences per revealed card) plus a manifest naming the model
+    version they were built with. Loaded memory-mapped; a lookup is a binary
+    search, no model call.
+    """
+
+    def __init__(self):
+        self.keys = None
+        self.bids = None
+        self.confidence = None
+        self.manifest = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def load(self, path, version):
+        try:
+            with open(os.path.join(path, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Opening index at {path} not loaded: {e}")
+            return False
+        if manifest.get("model_version") != version:
+            logger.warning(f"Opening index at {path} was built for other models; ignoring it")
+            return False
+        self.keys = np.load(os.path.join(path, 'keys.npy'), mmap_mode='r')
+        self.bids = np.load(os.path.join(path, 'bids.npy'), mmap_mode='r')
+        self.confidence = np.load(os.path.join(path, 'confidence.npy'), mmap_mode='r')
+        self.manifest = manifest
+        logger.info(f"📇 Opening index: {len(self.keys)} precomputed hands")
+        return True
+
+    def lookup(self, request: ProgressiveRequest):
+        """Progressive result for request from the index, or None"""
+        if self.keys is None:
+            return None
+        slot = _opening_slot(request)
+        row = None
+        if slot is not None:
+            i = int(np.searchsorted(self.keys, np.uint64(slot)))
+            if i < len(self.keys) and int(self.keys[i]) == slot:
+                row = i
+        with self._lock:
+            self._stats["hits" if row is not None else "misses"] += 1
+        if row is None:
+            return None
+        bids = [(_CALLS[code], None if np.isnan(conf) else float(conf))
+                for code, conf in zip(self.bids[row], self.confidence[row])]
+        return _progressive_summary(request, _reveal_prefixes(request.hand), bids)
+
+    @staticmethod
+    def write(path, entries, version):
+        """Save {slot: [(bid, confidence)] * 13} as an index for models `version`"""
+        os.makedirs(path, exist_ok=True)
+        slots = sorted(s for s, steps in entries.items()
+                       if len(steps) == 13 and all(bid in _CALL_CODES for bid, _ in steps))
+        if len(slots) < len(entries):
+            logger.warning(f"Opening index: skipped {len(entries) - len(slots)} entries with unexpected calls")
+        bids = np.array([[_CALL_CODES[bid] for bid, _ in entries[s]] for s in slots], dtype=np.uint8).reshape(-1, 13)
+        confidence = np.array([[np.nan if c is None else c for _, c in entries[s]] for s in slots],
+                              dtype=np.float32).reshape(-1, 13)
+        np.save(os.path.join(path, 'keys.npy'), np.array(slots, dtype=np.uint64))
+        np.save(os.path.join(path, 'bids.npy'), bids)
+        np.save(os.path.join(path, 'confidence.npy'), confidence)
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump({"model_version": version, "entries": len(slots), "built": time.time()}, f)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=0 if self.keys is None else len(self.keys))
+
+
+opening_index = OpeningIndex()
+
+# ------------------------------------------------------------
+# HTML visualization
+# ------------------------------------------------------------
+
+# Compiled once at import; rendering is plain substitution
+_PAGE_TEMPLATE = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Card-by-Card Analysis: $hand</title>
+<style>
+body { margin: 0; font-family: -apple-system, Segoe UI, Roboto, sans-serif;
+       background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); min-height: 100vh; }
+.card { max-width: 760px; margin: 24px auto; background: #fff; border-radius: 16px;
+        padding: 24px; box-shadow: 0 10px 40px rgba(0,0,0,.2); }
+h1 { margin: 0 0 4px; color: #4c3a8c; font-size: 1.5em; }
+.meta { color: #666; margin-bottom: 16px; }
+.summary { display: flex; flex-wrap: wrap; gap: 12px; margin-bottom: 20px; }
+.pill { background: #f3f0ff; border-radius: 10px; padding: 8px 14px; }
+.pill b { color: #4c3a8c; }
+.step { display: grid; grid-template-columns: 3em 11em 4em 1fr; align-items: center;
+        gap: 10px; padding: 6px 8px; border-radius: 8px; animation: fade .4s ease both; }
+.step.change { background: #fff4e0; border-left: 4px solid #f5a623; }
+.cards { font-family: monospace; }
+.bid { font-weight: bold; color: #4c3a8c; }
+.bar { background: #eee; border-radius: 6px; height: 12px; overflow: hidden; }
+.bar span { display: block; height: 100%; background: linear-gradient(90deg, #667eea, #764ba2); }
+@keyframes fade { from { opacity: 0; transform: translateY(4px); } to { opacity: 1; } }
+@media (max-width: 560px) { .step { grid-template-columns: 2.5em 1fr 3.5em; } .bar { grid-column: 1 / -1; } }
+</style>
+</head>
+<body>
+<div class="card">
+<h1>Card-by-Card Analysis</h1>
+<div class="meta">Hand <b>$hand</b> &middot; Auction: $auction</div>
+<div class="summary">
+<div class="pill">Final bid: <b>$final_bid</b></div>
+<div class="pill">Confidence: <b>$final_confidence</b></div>
+<div class="pill">Bid changes: <b>$num_changes</b></div>
+</div>
+$steps
+</div>
+</body>
+</html>
+""")
+
+_STEP_TEMPLATE = Template(
+    '<div class="step$change" style="animation-delay: ${delay}s">'
+    '<span>$num_cards</span><span class="cards">$cards</span><span class="bid">$bid</span>'
+    '<div class="bar" title="$confidence"><span style="width: $width%"></span></div></div>')
+
+
+def _percent(p):
+    return f"{p:.1%}" if isinstance(p, (int, float)) else "n/a"
+
+
+def render_progressive_html(result):
+    """Full HTML page for an /analyze/progressive result"""
+    changed_at = {c["at_card"] for c in result["summary"]["bid_changes"]}
+    rows = []
+    for i, step in enumerate(result["analysis_steps"]):
+        confidence = step["confidence"]
+        width = max(0.0, min(100.0, confidence * 100)) if isinstance(confidence, (int, float)) else 0
+        rows.append(_STEP_TEMPLATE.substitute(
+            change=" change" if step["num_cards"] in changed_at else "",
+            delay=f"{i * 0.05:.2f}",
+            num_cards=step["num_cards"],
+            cards=html.escape(step["cards_shown"]),
+            bid=html.escape(str(step["recommended_bid"])),
+            confidence=_percent(confidence),
+            width=f"{width:.1f}",
+        ))
+    summary = result["summary"]
+    return _PAGE_TEMPLATE.substitute(
+        hand=html.escape(result["full_hand"]),
+        auction=html.escape(' - '.join(result["auction"]) or '(none)'),
+        final_bid=html.escape(str(summary["final_recommendation"])),
+        final_confidence=_percent(summary["final_confidence"]),
+        num_changes=summary["num_changes"],
+        steps='\n'.join(rows),
+    )
+
+
+def _result_etag(result):
+    """Strong ETag derived from the analysis result (the page is a pure function of it)"""
+    payload = json.dumps(result, sort_keys=True, separators=(',', ':'), default=_json_default)
+    return '"' + hashlib.sha256(payload.encode()).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f"W/{etag}" in tags
+
+
+class HtmlPageCache:
+    """LRU of rendered pages keyed by ETag (i.e. by analysis-result hash)"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def page(self, etag, result):
+        with self._lock:
+            page = self._pages.get(etag)
+            if page is not None:
+                self._pages.move_to_end(etag)
+                self._stats["hits"] += 1
+                return page
+            self._stats["misses"] += 1
+        with STAGE_SECONDS.time('render'):
+            page = render_progressive_html(result)
+        if self.max_entries > 0:
+            with self._lock:
+                self._pages[etag] = page
+                while len(self._pages) > self.max_entries:
+                    self._pages.popitem(last=False)
+        return page
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._pages), max_entries=self.max_entries)
+
+
+html_pages = HtmlPageCache(HTML_CACHE_SIZE)
+
+# ============================================================
+# STEP 9: ASYNC JOBS
+# ============================================================
+
+_JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    request TEXT NOT NULL,
+    webhook TEXT,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    lease REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, created);
+"""
+
+_JOB_STATES = ("queued", "running", "done", "failed")
+
+
+def _webhook_allowed(url):
+    host = (urllib.parse.urlsplit(url).hostname or '').lower()
+    return any(host == allowed or (allowed.startswith('.') and host.endswith(allowed))
+               for allowed in JOB_WEBHOOK_HOSTS)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Webhooks are not followed to wherever a redirect points"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class JobQueue:
+    """
+    Durable queue of analysis jobs in a local SQLite file.
+
+    Jobs survive restarts. Each process claims jobs under an instance id of
+    its own and keeps renewing their lease while they run; a job whose lease
+    runs out (its process died, whatever pid the next one gets) goes back to
+    'queued'. Worker threads claim jobs one at a time (safe across processes
+    sharing the file) and run them on the server's event loop, through the
+    same executor and single-flight as requests; waiters in this process are
+    woken when a job finishes.
+    """
+
+    def __init__(self, path, workers=2, retention_hours=168, lease_seconds=60):
+        self.path = path
+        self.workers = workers
+        self.retention = retention_hours * 3600
+        self.lease = lease_seconds
+        self.instance = None
+        self.loop = None
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._waiters = {}
+        self._threads = []
+        self._stats = {"completed": 0, "failed": 0, "webhook_errors": 0}
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_JOBS_SCHEMA)
+            if 'lease' not in {row[1] for row in db.execute("PRAGMA table_info(jobs)")}:
+                try:
+                    db.execute("ALTER TABLE jobs ADD COLUMN lease REAL")
+                except sqlite3.OperationalError:
+                    pass  # added by another process meanwhile
+            self._local.db = db
+        return db
+
+    def submit(self, requests, webhook=None):
+        """Queue one job per AnalysisRequest in a single transaction; returns their ids"""
+        now = time.time()
+        ids = [uuid.uuid4().hex for _ in requests]
+        rows = [(job_id, r.model_dump_json() if hasattr(r, 'model_dump_json') else r.json(), webhook, now)
+                for job_id, r in zip(ids, requests)]
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany("INSERT INTO jobs (id, request, webhook, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                           rows)
+        self._wake.set()
+        return ids
+
+    def get(self, job_id):
+        """Public view of a job, or None if unknown"""
+        row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {"id": row["id"], "status": row["status"], "created": row["created"],
+               "started": row["started"], "finished": row["finished"]}
+        if row["status"] == "done":
+            job["result"] = json.loads(row["result"])
+        elif row["status"] == "failed":
+            job["error"] = row["error"]
+        return job
+
+    async def wait(self, job_id, timeout):
+        """get(job_id), first waiting up to timeout seconds for it to finish"""
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_event_loop()
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in ("done", "failed") or remaining <= 0:
+                return job
+            event = asyncio.Event()
+            with self._lock:
+                self._waiters.setdefault(job_id, []).append((loop, event))
+            try:
+                # Re-check now and then: another worker process may finish it
+                await asyncio.wait_for(event.wait(), min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    waiters = self._waiters.get(job_id, [])
+                    if (loop, event) in waiters:
+                        waiters.remove((loop, event))
+                    if not waiters:
+                        self._waiters.pop(job_id, None)
+
+    def _notify(self, job_id):
+        with self._lock:
+            waiters = self._waiters.pop(job_id, [])
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _claim(self):
+        """Mark the oldest queued job running for this process; (id, request, webhook) or None"""
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT id, request, webhook FROM jobs WHERE status = 'queued' "
+                             "ORDER BY created LIMIT 1").fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            db.execute("UPDATE jobs SET status = 'running', owner = ?, started = ?, lease = ? WHERE id = ?",
+                       (self.instance, now, now + self.lease, row["id"]))
+        return row["id"], row["request"], row["webhook"]
+
+    def _finish(self, job_id, result=None, error=None):
+        status = "failed" if error is not None else "done"
+        self._db().execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, lease = NULL "
+                           "WHERE id = ?",
+                           (status, None if result is None else json.dumps(result, default=_json_default),
+                            error, time.time(), job_id))
+        with self._lock:
+            self._stats["failed" if error is not None else "completed"] += 1
+        self._notify(job_id)
+
+    def recover(self):
+        """Requeue running jobs whose lease has run out (their process died)"""
+        cur = self._db().execute("UPDATE jobs SET status = 'queued', owner = NULL, started = NULL, lease = NULL "
+                                 "WHERE status = 'running' AND (lease IS NULL OR lease < ?)", (time.time(),))
+        if cur.rowcount:
+            self._wake.set()
+        return cur.rowcount
+
+    def _heartbeat(self):
+        """Renew the leases of this process's running jobs and requeue expired ones"""
+        while True:
+            time.sleep(self.lease / 3)
+            try:
+                self._db().execute("UPDATE jobs SET lease = ? WHERE status = 'running' AND owner = ?",
+                                   (time.time() + self.lease, self.instance))
+                recovered = self.recover()
+                if recovered:
+                    logger.info(f"📬 Requeued {recovered} jobs whose worker stopped renewing them")
+            except sqlite3.Error as e:
+                logger.warning(f"Job queue heartbeat error: {e}")
+
+    def purge(self):
+        """Delete finished jobs older than the retention period"""
+        cur = self._db().execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                                 (time.time() - self.retention,))
+        return cur.rowcount
+
+    def start(self, loop):
+        """Recover interrupted jobs and start the worker threads; jobs run on `loop`"""
+        self.instance = uuid.uuid4().hex
+        self.loop = loop
+        recovered = self.recover()
+        purged = self.purge()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"ben-jobs-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        threading.Thread(target=self._heartbeat, name="ben-jobs-heartbeat", daemon=True).start()
+        logger.info(f"📬 Job queue {self.path}: {self.workers} workers, "
+                    f"{recovered} interrupted jobs requeued, {purged} old jobs purged")
+
+    def _loop(self):
+        last_purge = time.monotonic()
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logger.warning(f"Job queue error: {e}")
+                job = None
+            if job is None:
+                if time.monotonic() - last_purge > 600:
+                    self.purge()
+                    last_purge = time.monotonic()
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            try:
+                self._run(*job)
+            except Exception as e:
+                logger.error(f"❌ Job worker error: {e}")
+
+    def _run(self, job_id, request_json, webhook):
+        try:
+            request = AnalysisRequest(**json.loads(request_json))
+            result = asyncio.run_coroutine_threadsafe(_run_job(request), self.loop).result()
+            self._finish(job_id, result=result)
+        except Exception as e:
+            logger.error(f"❌ Job {job_id}: {e}")
+            self._finish(job_id, error=str(e))
+        if webhook:
+            self._post_webhook(webhook, job_id)
+
+    def _post_webhook(self, url, job_id):
+        """Best-effort POST of the finished job to its webhook, with a few retries"""
+        body = json.dumps(self.get(job_id), default=_json_default).encode()
+        for attempt in range(3):
+            try:
+                req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+                with urllib.request.build_opener(_NoRedirect).open(req, timeout=10):
+                    return
+            except Exception as e:
+                logger.warning(f"Webhook for job {job_id} failed ({attempt + 1}/3): {e}")
+                time.sleep(2 ** attempt)
+        with self._lock:
+            self._stats["webhook_errors"] += 1
+
+    def stats(self):
+        counts = dict.fromkeys(_JOB_STATES, 0)
+        counts.update(self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        with self._lock:
+            return dict(self._stats, **counts, workers=len(self._threads), instance=self.instance)
+
+
+async def _run_job(request: AnalysisRequest):
+    """
+    Analyze one queued deal like a request: result cache, single-flight and the
+    bounded executor, but waiting for a slot instead of failing when it is
+    saturated, and running to completion whatever the deadlines.
+    """
+    key, result = _cached(request)
+    if result is not None:
+        return result
+    while True:
+        try:
+            return await _analyze_shared(request, key, bounded=False)
+        except InferenceSaturated as e:
+            await asyncio.sleep(float(e.headers["Retry-After"]))
+
+
+jobs = JobQueue(JOBS_DB, JOB_WORKERS, JOB_RETENTION_HOURS, JOB_LEASE_SECONDS)
+
+# ============================================================
+# STEP 10: APP AND ROUTES
+# ============================================================
+
+def load_models(network_factory=None):
+    """
+    Load Ben's models and sampler into the module globals. network_factory,
+    if given, builds each network from Keras' load_model arguments instead of
+    loading it (benchmark.py's stubs).
+    """
+    global models, CardByCard, sampler, model_version
+    
+    # Before Ben's modules bind Keras' load_model
+    install_deferred_loading()
+    
+    # The file is models_tf2.py, not models.py
+    from nn.models_tf2 import Models
+    from analysis import CardByCard as CBC
+    from sample import Sample
+    
+    CardByCard = CBC
+    
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(TF_INTRA_OP_THREADS)
+        tf.config.threading.set_inter_op_parallelism_threads(TF_INTER_OP_THREADS)
+    except RuntimeError as e:
+        # TF refuses once its runtime is initialized (e.g. models already loaded)
+        logger.warning(f"TF thread settings not applied: {e}")
+    logger.info(f"🧵 Worker {os.getpid()}: {INFERENCE_WORKERS} inference threads, "
+                f"TF {TF_INTRA_OP_THREADS} intra-op / {TF_INTER_OP_THREADS} inter-op")
+    
+    from configparser import ConfigParser
+    conf = ConfigParser()
+    conf.read('config/default.conf')
+    model_version = _model_version('config/default.conf')
+    
+    logger.info("🧠 Loading models...")
+    with deferred_loading() as requested:
+        models = Models.from_conf(conf, '..')  # Models are in /app/ben/models, we're in /app/ben/src
+    for name, owner in _iter_nn_models(models):
+        if isinstance(owner.model, LazyNetwork):
+            owner.model.name = name
+    networks[:] = requested
+    if network_factory is not None:
+        for network in requested:
+            network._loader = network_factory
+    # Networks converted at --prepare load from their .tflite files alone
+    from_artifact = tflite_loaders(requested) if RUNTIME == 'tflite' and network_factory is None else []
+    if LAZY_MODELS:
+        for network in requested:
+            network.warm_on_load = WARMUP
+        if MODEL_IDLE_SECONDS > 0:
+            threading.Thread(target=_evict_idle_networks, args=(MODEL_IDLE_SECONDS,),
+                             name="ben-model-evictor", daemon=True).start()
+        logger.info(f"💤 {len(requested)} networks will load on first use")
+    else:
+        for network in requested:
+            network.load()
+    
+    # Create sampler; layouts are shared between the decisions of a deal
+    sampler = SharedSampler(Sample.from_conf(conf, '..'))
+    
+    if os.path.isdir(OPENING_INDEX_DIR):
+        opening_index.load(OPENING_INDEX_DIR, model_version)
+    
+    batched = install_model_batching(models)
+    replayable = install_step_replay()
+    # Per-request depth tiers; they share the networks (and their batching)
+    tiers.clear()
+    tiers.update(build_tiers(models, sampler))
+    if RUNTIME == 'tflite':
+        tflite = from_artifact or install_tflite(models)
+        logger.info(f"🗜️ TFLite ({TFLITE_QUANT}) serving {len(tflite)}/{len(batched)} networks")
+    logger.info(f"✅ Models loaded! (batching {len(batched)} networks, "
+                f"replaying {', '.join(replayable) or 'nothing'})")
+
+def _load_and_warm():
+    """Load and warm up the models, recording the timings in readiness"""
+    start = time.time()
+    load_models()
+    readiness["load_seconds"] = round(time.time() - start, 2)
+    
+    if WARMUP:
+        readiness["state"] = "warming"
+        logger.info("🔥 Warming up models...")
+        start = time.time()
+        readiness["models"] = warm_up_models(models, _warmup_batch_sizes())
+        # A full deal would load every network; lazy ones warm up as they load
+        if not LAZY_MODELS:
+            try:
+                deal_start = time.time()
+                _analyze_deal(_WARMUP_DEAL)
+                readiness["deal_seconds"] = round(time.time() - deal_start, 2)
+            except Exception as e:
+                logger.warning(f"Warm-up deal failed: {e}")
+        readiness["warmup_seconds"] = round(time.time() - start, 2)
+    
+    readiness["state"] = "ready"
+    readiness["startup_seconds"] = round(time.time() - _BOOT_TIME, 2)
+    logger.info(f"🚀 Ready {readiness['startup_seconds']:.1f}s after process start")
+
+def _startup(loop):
+    """Load and warm up the models (runs in a background thread)"""
+    logger.info("🔄 Loading Ben neural network models...")
+    
+    try:
+        _load_and_warm()
+        
+        # Queued jobs wait for the models; drain them from here on
+        try:
+            jobs.start(loop)
+        except sqlite3.Error as e:
+            logger.error(f"❌ Job queue unavailable ({JOBS_DB}): {e}")
+    except Exception as e:
+        readiness["state"] = "failed"
+        logger.error(f"❌ Load error: {e}")
+        import traceback
+        traceback.print_exc()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve /health and /ready while the models load and warm up
+    threading.Thread(target=_startup, args=(asyncio.get_running_loop(),), name="ben-startup", daemon=True).start()
+    yield
+
+def measure_cold_start():
+    """Start a fresh process that loads and warms up as the server does; its timings, or None if it failed"""
+    import subprocess
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--measure-startup'],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(proc.stdout[-2000:], proc.stderr[-2000:])
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def prepare():
+    """
+    Build-time step: verify the patched Ben sources, byte-compile them, load
+    the models once (converting them under BEN_RUNTIME=tflite), then time a
+    cold start from what was built and write PREPARED_STAMP so startup skips
+    patching.
+    """
+    errors = verify_patched_files()
+    if errors:
+        print("❌ Errors:", errors)
+        return False
+    
+    import compileall
+    compileall.compile_dir('.', quiet=1)
+    print("✅ Ben sources byte-compiled")
+    
+    start = time.time()
+    load_models()
+    load_seconds = time.time() - start
+    print(f"✅ Models load in {load_seconds:.1f}s")
+    
+    stamp = {"fingerprint": _patch_fingerprint(), "model_version": model_version,
+             "load_seconds": round(load_seconds, 2), "python": sys.version.split()[0]}
+    with open(PREPARED_STAMP, 'w') as f:
+        json.dump(stamp, f)
+    
+    # With the stamp in place the child skips patching, as the server will
+    startup = measure_cold_start()
+    if startup is None:
+        print("❌ Cold start failed")
+        return False
+    print(f"✅ Cold start: ready in {startup['startup_seconds']:.1f}s (load {startup['load_seconds']}s, "
+          f"warm-up {startup['warmup_seconds'] or 0}s)")
+    stamp["startup"] = startup
+    with open(PREPARED_STAMP, 'w') as f:
+        json.dump(stamp, f)
+    print(f"✅ Wrote {PREPARED_STAMP}")
+    if startup['startup_seconds'] > STARTUP_BUDGET_SECONDS:
+        print(f"❌ Cold start exceeds BEN_STARTUP_BUDGET_SECONDS ({STARTUP_BUDGET_SECONDS:g}s)")
+        return False
+    return True
+
+app = FastAPI(
+    title="Ben Bridge Analysis API",
+    description="Neural network only - no DDS/BBA",
+    version="2.0",
+    lifespan=lifespan
+)
+
+@app.get("/")
+def root():
+    return {"service": "Ben NN API", "status": readiness["state"]}
+
+@app.get("/health")
+def health():
+    if readiness["state"] != "ready":
+        return JSONResponse({"status": readiness["state"], "models": models is not None}, status_code=503)
+    # The synchronous API keeps serving without the job queue; so must its healthcheck
+    try:
+        job_stats = jobs.stats()
+    except sqlite3.Error as e:
+        logger.warning(f"Job queue unavailable ({JOBS_DB}): {e}")
+        job_stats = "unavailable"
+    return {"status": "healthy", "models": models is not None, "worker": os.getpid(),
+            "batching": batcher.stats(), "inference": inference.stats(), "coalescing": in_flight.stats(),
+            "jobs": job_stats}
+
+@app.get("/ready")
+def ready():
+    """Readiness state with load and warm-up timings (ms per model and batch size)"""
+    return JSONResponse(readiness, status_code=200 if readiness["state"] == "ready" else 503)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {**result_cache.stats(), "incremental": deal_states.stats(),
+            "sampling": sampler.stats() if isinstance(sampler, SharedSampler) else None,
+            "html": html_pages.stats(), "opening_index": opening_index.stats(),
+            "tiers": {name: {"analyses": list(t.analyses), "sampling": t.sampler.stats()} for name, t in tiers.items()}}
+
+@app.middleware("http")
+async def _mark_request_start(request: Request, call_next):
+    _request_start.set(time.perf_counter())
+    return await call_next(request)
+
+def _is_admin(token):
+    return bool(ADMIN_TOKEN and token and hmac.compare_digest(token, ADMIN_TOKEN))
+
+def _require_admin(http_request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(404, "Admin endpoints are disabled (set BEN_ADMIN_TOKEN)")
+    if not _is_admin(http_request.headers.get("x-admin-token")):
+        raise HTTPException(403, "Invalid admin token")
+
+@app.post("/admin/profile")
+def admin_profile(http_request: Request, calls: int = 1, interval_ms: float = 5.0):
+    """Profile the next `calls` computed /analyze requests (0 disarms)"""
+    _require_admin(http_request)
+    return {"armed": profiler.arm(calls, interval_ms), "interval_ms": max(interval_ms, 0.5)}
+
+@app.get("/admin/profiles")
+def admin_profiles(http_request: Request):
+    _require_admin(http_request)
+    return profiler.list()
+
+@app.get("/admin/profiles/{profile_id}")
+def admin_profile_folded(profile_id: str, http_request: Request):
+    """One profile as folded stacks, ready for flamegraph.pl or speedscope"""
+    _require_admin(http_request)
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(404, f"No profile {profile_id}")
+    return Response(profile.folded(), media_type="text/plain; charset=utf-8")
+
+@app.get("/admin/models")
+def admin_models(http_request: Request):
+    """Per-network load state, load time and memory"""
+    _require_admin(http_request)
+    return {"lazy": LAZY_MODELS, "idle_seconds": MODEL_IDLE_SECONDS or None, "rss_mb": _mb(_rss_bytes()),
+            "loaded_weight_mb": _mb(sum(n.weight_bytes or 0 for n in networks if n.loaded)),
+            "models": [n.report() for n in networks]}
+
+@app.post("/admin/models/{name}/{action}")
+def admin_model_action(name: str, action: str, http_request: Request):
+    """Load or unload one network by name (as listed by GET /admin/models)"""
+    _require_admin(http_request)
+    network = next((n for n in networks if n.name == name), None)
+    if network is None:
+        raise HTTPException(404, "Unknown model")
+    if action == "load":
+        network.load()
+    elif action == "unload":
+        if not network.unload() and network.loaded:
+            raise HTTPException(409, "Model is in use or referenced; not unloaded")
+    else:
+        raise HTTPException(400, "action must be 'load' or 'unload'")
+    return network.report()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics for this worker: stage latencies, model calls, queues and caches"""
+    ex, bt, rc = inference.stats(), batcher.stats(), result_cache.stats()
+    lines = STAGE_SECONDS.expose() + MODEL_CALL_SECONDS.expose() + MODEL_BATCH_ROWS.expose() + TIER_SECONDS.expose()
+    lines += _sample_lines('ben_inference_running', 'Analyses running on the inference executor', 'gauge',
+                           [({}, ex["running"])])
+    lines += _sample_lines('ben_inference_queued', 'Analyses admitted and waiting for an executor thread', 'gauge',
+                           [({}, ex["queued"])])
+    lines += _sample_lines('ben_inference_utilization', 'Fraction of executor threads busy', 'gauge',
+                           [({}, round(ex["running"] / ex["workers"], 4))])
+    lines += _sample_lines('ben_inference_rejected_total', 'Analyses rejected with 429', 'counter',
+                           [({}, ex["rejected"])])
+    lines += _sample_lines('ben_inference_completed_total', 'Analyses finished on the executor', 'counter',
+                           [({}, ex["completed"])])
+    lines += _sample_lines('ben_model_loaded', 'Whether each network is loaded (lazy loading)', 'gauge',
+                           [({"model": n.name}, int(n.loaded)) for n in networks])
+    with _partial_results_lock:
+        partials = sorted(_partial_results.items())
+    lines += _sample_lines('ben_partial_results_total', 'Analyses stopped by their deadline, per next stage',
+                           'counter', [({"stage": stage}, n) for stage, n in partials])
+    lines += _sample_lines('ben_coalesced_requests_total', 'Requests that joined an identical running analysis',
+                           'counter', [({}, in_flight.stats()["coalesced"])])
+    lines += _sample_lines('ben_batcher_pending_calls', 'Model calls waiting to be merged', 'gauge',
+                           [({}, bt["pending"])])
+    lines += _sample_lines('ben_batcher_participants', 'Analyses currently feeding the batcher', 'gauge',
+                           [({}, bt["participants"])])
+    lines += _sample_lines('ben_result_cache_total', 'Result cache lookups by outcome', 'counter',
+                           [({"outcome": "hit"}, rc["hits"]), ({"outcome": "disk_hit"}, rc["disk_hits"]),
+                            ({"outcome": "miss"}, rc["misses"])])
+    with _tier_lookups_lock:
+        lookups = sorted(_tier_lookups.items())
+    lines += _sample_lines('ben_tier_cache_total', 'Result cache lookups per depth tier', 'counter',
+                           [({"tier": tier, "outcome": outcome}, n) for (tier, outcome), n in lookups])
+    return Response('\n'.join(lines) + '\n', media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _new_card_by_card(request: AnalysisRequest):
+    # Canonical strings rebuilt from the parsed deal (ranks ordered, calls normalized)
+    dealer, vuln, hands, auction, play = request.deal().strings()
+    tier = tiers[request.tier]
+    return CardByCard(
+        dealer=dealer,
+        vuln=vuln,
+        hands=hands,
+        auction=auction,
+        play=play if 'play' in tier.analyses else [],
+        models=tier.models,
+        sampler=tier.sampler,
+        verbose=False
+    )
+
+def _run_cbc(cbc):
+    """Run cbc.analyze() to completion (newer Ben versions make it a coroutine)"""
+    pending = cbc.analyze()
+    if asyncio.iscoroutine(pending):
+        asyncio.run(pending)
+
+def _step_dict(resp):
+    """JSON-ready form of one BidResp/CardResp"""
+    if hasattr(resp, 'to_dict'):
+        resp = resp.to_dict()
+    return _plain(resp)
+
+def _analysis_result(cbc):
+    result = {"status": "success", "bidding": [], "play": []}
+    
+    if hasattr(cbc, 'bid_analysis'):
+        result["bidding"] = cbc.bid_analysis
+    elif hasattr(cbc, 'bid_responses'):
+        result["bidding"] = [_step_dict(r) for r in cbc.bid_responses]
+    
+    if hasattr(cbc, 'play_analysis'):
+        result["play"] = cbc.play_analysis
+    elif hasattr(cbc, 'card_responses'):
+        result["play"] = [_step_dict(r) for r in cbc.card_responses]
+    
+    return result
+
+def _analyze_deal(request: AnalysisRequest, key=None, deadline=None, on_bid=None, on_card=None):
+    """
+    Run a full analysis on the calling (executor) thread and cache the result.
+    Past deadline (a perf_counter time) it returns the steps done so far, marked
+    partial and not cached.
+    """
+    tier = tiers[request.tier]
+    play = (request.play or []) if 'play' in tier.analyses else []
+    state_key = _deal_key(request)
+    session = deal_states.session(state_key, play)
+    with batcher.participate(), STAGE_SECONDS.time('analysis'), TIER_SECONDS.time(tier.name):
+        with STAGE_SECONDS.time('construct'):
+            cbc = _new_card_by_card(request)
+        _observe(cbc, 'bid_responses', session.mark_bid)
+        _observe(cbc, 'card_responses', session.mark_card)
+        if on_bid is not None:
+            _observe(cbc, 'bid_responses', on_bid)
+        if on_card is not None:
+            _observe(cbc, 'card_responses', on_card)
+        _replay_local.session = session
+        _replay_local.deadline = deadline
+        stopped = None
+        try:
+            _run_cbc(cbc)
+        except _DeadlineExceeded as e:
+            stopped = e.stage
+        finally:
+            _replay_local.session = None
+            _replay_local.deadline = None
+        with STAGE_SECONDS.time('serialize'):
+            result = _analysis_result(cbc)
+    if tier.name != 'standard':
+        result["tier"] = tier.name
+        if tier.skipped:
+            result["skipped"] = tier.skipped
+    # Steps finished before a deadline are still kept, so a retry resumes from them
+    deal_states.save(state_key, play, session)
+    if stopped is not None:
+        _count_partial(stopped)
+        logger.info(f"⏱️ Deadline reached before the next {stopped}: "
+                    f"{len(result['bidding'])} bids, {len(result['play'])} cards")
+        result["partial"] = True
+        return result
+    if key is not None:
+        result_cache.put(key, result)
+    return result
+
+def _parse_deal(request: AnalysisRequest):
+    """Parse the request's deal once, answering 400 if it is malformed"""
+    try:
+        return request.deal()
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+def _cached(request: AnalysisRequest):
+    """Return (cache key, cached result or None); key is None when caching is off"""
+    if not result_cache.enabled:
+        return None, None
+    key = _cache_key(request)
+    result = result_cache.get(key)
+    _count_tier_lookup(request.tier, result is not None)
+    return key, result
+
+def _deadline_ms(request: AnalysisRequest):
+    """Time limit of an online request's analysis in ms: its deadline_ms capped by BEN_DEADLINE_MS (None: none)"""
+    ms = request.deadline_ms
+    if DEADLINE_MS:
+        ms = min(ms or DEADLINE_MS, DEADLINE_MS)
+    return ms or None
+
+def _deadline(request: AnalysisRequest):
+    """perf_counter time by which request's analysis must finish, counted from its arrival (None: no limit)"""
+    ms = _deadline_ms(request)
+    if ms is None:
+        return None
+    start = _request_start.get() or time.perf_counter()
+    return start + ms / 1000
+
+def _flight_key(request: AnalysisRequest, key=None, bounded=True):
+    """Single-flight key: analyses are only shared under the same time limit"""
+    key = key or _cache_key(request)
+    ms = _deadline_ms(request) if bounded else None
+    return key if ms is None else (key, ms)
+
+def _analyze_shared(request: AnalysisRequest, key=None, acquired=False, held=False, bounded=True):
+    """
+    Awaitable analysis of request, shared with an identical one already
+    running; bounded=False runs it to completion, ignoring deadlines.
+    """
+    deadline = _deadline(request) if bounded else None
+    return in_flight.join(_flight_key(request, key, bounded),
+                          lambda: inference.submit(_analyze_deal, request, key, deadline,
+                                                   acquired=acquired, held=held))
+
+@app.post("/analyze")
+async def analyze(request: AnalysisRequest, http_request: Request):
+    observe_parse()
+    if not models:
+        raise HTTPException(503, "Models not loaded")
+    _parse_deal(request)
+    
+    try:
+        # X-Ben-Profile: <admin token> profiles this request (bypassing the cache)
+        forced = _is_admin(http_request.headers.get("x-ben-profile"))
+        key, result = _cached(request)
+        if result is not None and not forced:
+            logger.info("⚡ Cache hit")
+            return result
+        
+        logger.info("🎴 Analyzing...")
+        
+        # Run analysis on the bounded inference pool (429 when saturated)
+        profile = profiler.claim(f"/analyze {request.dealer} {' '.join(request.auction)}", forced)
+        if profile is None:
+            result = await _analyze_shared(request, key)
+        else:
+            result = await inference.submit(profiler.run, profile, _analyze_deal, request, key,
+                                            _deadline(request))
+            logger.info(f"🔬 Profile {profile.id}: {profile.seconds}s")
+            return JSONResponse(result, headers={"X-Ben-Profile-Id": profile.id})
+            
+        logger.info("✅ Done!")
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(500, str(e))
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: BatchAnalysisRequest):
+    """Analyze many deals at once, merging their NN calls into shared batches"""
+    observe_parse()
+    if not models:
+        raise HTTPException(503, "Models not loaded")
+    
+    logger.info(f"🎴 Analyzing batch of {len(request.deals)} deals...")
+    
+    outcomes = [None] * len(request.deals)
+    keys = {}
+    for board, deal in enumerate(request.deals):
+        try:
+            deal.deal()
+        except ValueError as e:
+            outcomes[board] = e
+            continue
+        keys[board], outcomes[board] = _cached(deal)
+    
+    # One analysis per distinct deal, joining any already running elsewhere.
+    # The new ones get as many executor slots as are free (429 only if none
+    # are) and queue for them here, so a batch larger than the executor's
+    # queue still completes
+    pending = [board for board, outcome in enumerate(outcomes) if outcome is None]
+    flight_keys = {board: _flight_key(request.deals[board], keys[board]) for board in pending}
+    starting = {flight_keys[board] for board in pending if not in_flight.active(flight_keys[board])}
+    lanes = 0
+    
+    async def run(board, lane):
+        deal = request.deals[board]
+        if in_flight.active(flight_keys[board]):
+            return await _analyze_shared(deal, keys[board])
+        if not lanes:
+            # Its flight landed after the count above; admit it on its own
+            return await _analyze_shared(deal, keys[board])
+        async with lane:
+            return await _analyze_shared(deal, keys[board], held=True)
+    
+    try:
+        lanes = inference.acquire_up_to(len(starting))
+        lane = asyncio.Semaphore(lanes)
+        computed = await asyncio.gather(*[run(board, lane) for board in pending], return_exceptions=True)
+    finally:
+        inference.release(lanes)
+    for board, outcome in zip(pending, computed):
+        outcomes[board] = outcome
+    
+    results = []
+    for board, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"❌ Board {board}: {outcome}")
+            results.append({"board": board, "status": "error", "detail": str(outcome)})
+        else:
+            results.append({"board": board, **outcome})
+    
+    logger.info("✅ Batch done!")
+    return {"status": "success", "results": results}
+
+_STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def _format_event(event, fmt):
+    data = json.dumps(event, default=_json_default)
+    if fmt == "sse":
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+async def _cached_events(cached):
+    for i, bid in enumerate(cached["bidding"]):
+        yield {"type": "bid", "index": i, "data": bid}
+    for i, card in enumerate(cached["play"]):
+        yield {"type": "card", "index": i, "data": card}
+    yield {"type": "done", "status": "success", "cached": True}
+
+def _analysis_events(request: AnalysisRequest):
+    """
+    Async iterator of bid/card events as CardByCard produces them, then a final
+    done/error event. The analysis is admitted here, before the response starts,
+    so a saturated server can still answer 429.
+    """
+    key, cached = _cached(request)
+    if cached is not None:
+        return _cached_events(cached)
+    
+    loop = asyncio.get_event_loop()
+    queue = asyncio.Queue()
+    counts = {"bid": 0, "card": 0}
+    
+    def emitter(kind):
+        def emit(resp):
+            event = {"type": kind, "index": counts[kind], "data": _step_dict(resp)}
+            counts[kind] += 1
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        return emit
+    
+    deadline = _deadline(request)
+    
+    def run():
+        try:
+            result = _analyze_deal(request, key, deadline, on_bid=emitter("bid"), on_card=emitter("card"))
+            event = {"type": "done", "status": "success", "cached": False}
+            if result.get("partial"):
+                event["partial"] = True
+        except Exception as e:
+            logger.error(f"❌ Stream error: {e}")
+            event = {"type": "error", "detail": str(e)}
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+    
+    task = inference.submit(run)
+    
+    async def events():
+        try:
+            while True:
+                event = await queue.get()
+                yield event
+                if event["type"] in ("done", "error"):
+                    break
+        finally:
+            await task
+    return events()
+
+@app.post("/analyze/stream")
+async def analyze_stream(request: AnalysisRequest, format: str = "ndjson"):
+    """Stream each bid and card evaluation as soon as it is computed (NDJSON or SSE)"""
+    observe_parse()
+    if not models:
+        raise HTTPException(503, "Models not loaded")
+    if format not in _STREAM_MEDIA_TYPES:
+        raise HTTPException(400, f"format must be one of {sorted(_STREAM_MEDIA_TYPES)}")
+    _parse_deal(request)
+    
+    logger.info(f"🎴 Streaming analysis ({format})...")
+    events = _analysis_events(request)
+    
+    async def body():
+        async for event in events:
+            yield _format_event(event, format)
+    
+    return StreamingResponse(body(), media_type=_STREAM_MEDIA_TYPES[format])
+
+@app.post("/analyze/msgpack")
+async def analyze_msgpack(http_request: Request):
+    """
+    /analyze for high-volume clients: msgpack request and response. The deal
+    may use the JSON field format, or the compact one from Deal.to_compact()
+    (hands as 52-bit masks, vuln as bits, auction/play as byte codes).
+    """
+    observe_parse()
+    try:
+        import msgpack
+    except ImportError:
+        raise HTTPException(501, "msgpack is not installed")
+    if not models:
+        raise HTTPException(503, "Models not loaded")
+    
+    try:
+        data = msgpack.unpackb(await http_request.body(), raw=False)
+        if data['hands'] and isinstance(data['hands'][0], int):
+            deal = Deal.from_compact(data)
+        else:
+            deal = Deal.parse(data['dealer'], data['vuln'], data['hands'], data['auction'], data.get('play') or [])
+    except Exception as e:
+        raise HTTPException(400, f"Bad msgpack deal: {e}")
+    try:
+        request = AnalysisRequest.from_deal(deal, data.get('tier', 'standard'), data.get('deadline_ms'))
+        request.deal()
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    
+    try:
+        key, result = _cached(request)
+        if result is None:
+            result = await _analyze_shared(request, key)
+        # Fresh results may hold numpy values, which msgpack can't pack
+        body = msgpack.packb(_plain(result), use_bin_type=True)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error: {e}")
+        raise HTTPException(500, str(e))
+    return Response(body, media_type="application/msgpack")
+
+def _queue_jobs(deals, webhook, http_request: Request):
+    """Validate deals (400 on the first bad one) and the webhook, then queue them as jobs"""
+    for board, deal in enumerate(deals):
+        try:
+            deal.deal()
+        except ValueError as e:
+            raise HTTPException(400, f"board {board}: {e}")
+    if webhook:
+        if not webhook.startswith(("http://", "https://")):
+            raise HTTPException(400, "webhook must be an http(s) URL")
+        if not _webhook_allowed(webhook) and not _is_admin(http_request.headers.get("x-admin-token")):
+            raise HTTPException(403, "webhook host not allowed (see BEN_JOB_WEBHOOK_HOSTS)")
+    try:
+        return jobs.submit(deals, webhook)
+    except sqlite3.Error as e:
+        logger.error(f"❌ Job queue error: {e}")
+        raise HTTPException(503, "Job queue unavailable")
+
+@app.post("/jobs", status_code=202)
+def submit_job(request: JobRequest, http_request: Request):
+    """Queue one deal for analysis and return its job id straight away"""
+    job_id, = _queue_jobs([request.deal], request.webhook, http_request)
+    return {"id": job_id, "status": "queued"}
+
+@app.post("/jobs/batch", status_code=202)
+def submit_jobs(request: BatchJobRequest, http_request: Request):
+    """Queue many deals at once; one job id per deal, in order"""
+    logger.info(f"📬 Queueing {len(request.deals)} jobs...")
+    return {"ids": _queue_jobs(request.deals, request.webhook, http_request), "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """
+    A job's status, plus its result once done (or error once failed).
+    `?wait=N` long-polls up to N seconds (at most 60) for it to finish.
+    """
+    job = await jobs.wait(job_id, min(max(wait, 0.0), 60.0))
+    if job is None:
+        raise HTTPException(404, "Unknown job")
+    return job
+
+async def _progressive_result(request: ProgressiveRequest):
+    """Validate, then serve a progressive analysis from the cache or compute it"""
+    observe_parse()
+    if not models:
+        raise HTTPException(503, "Models not loaded")
+    if not (0 <= request.seat < 4 and 0 <= request.dealer < 4):
+        raise HTTPException(400, "seat and dealer must be 0-3")
+    if (request.dealer + len(request.auction or [])) % 4 != request.seat % 4:
+        raise HTTPException(400, f"seat {request.seat} is not on turn after {len(request.auction or [])} calls")
+    
+    try:
+        _reveal_prefixes(request.hand)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    
+    try:
+        result = opening_index.lookup(request)
+        if result is not None:
+            logger.info("📇 Opening index hit")
+            return result
+        
+        key, result = _progressive_cached(request)
+        if result is not None:
+            logger.info("⚡ Cache hit")
+            return result
+        
+        logger.info("🃏 Progressive analysis...")
+        result = await in_flight.join(("progressive", key or _progressive_key(request)),
+                                      lambda: inference.submit(_run_progressive, request, key))
+        logger.info("✅ Done!")
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(500, str(e))
+
+@app.post("/analyze/progressive")
+async def progressive(request: ProgressiveRequest):
+    """How the recommended bid evolves as the hand's cards are revealed one by one"""
+    return await _progressive_result(request)
+
+@app.post("/analyze/html")
+async def progressive_html(request: ProgressiveRequest, http_request: Request, format: str = "json"):
+    """
+    Progressive analysis as an HTML page: `?format=html` serves it as text/html,
+    the default wraps it as {"html": ...}. Both honour If-None-Match.
+    """
+    if format not in ("json", "html"):
+        raise HTTPException(400, "format must be 'json' or 'html'")
+    
+    result = await _progressive_result(request)
+    etag = _result_etag(result)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    page = html_pages.page(etag, result)
+    if format == "html":
+        return Response(page, media_type="text/html; charset=utf-8", headers=headers)
+    return JSONResponse({"html": page}, headers=headers)
+
+if __name__ == "__main__":
+    if '--prepare' in sys.argv[1:]:
+        sys.exit(0 if prepare() else 1)
+    if '--measure-startup' in sys.argv[1:]:
+        _load_and_warm()
+        print(json.dumps({k: readiness[k] for k in ('startup_seconds', 'load_seconds', 'warmup_seconds', 'deal_seconds')}))
+        sys.exit(0)
+    
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    if WORKERS > 1:
+        # uvicorn's supervisor owns the socket and spreads connections across
+        # workers; each worker re-imports this module by name
+        uvicorn.run("card_analysis_api:app", host="0.0.0.0", port=8080, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+"""
+Pure-Python double-dummy solver
+Stands in for the native DDS library behind the ddsolver module names Ben imports.
+Exact within a node budget per call (BEN_DD_NODE_BUDGET); beyond it, estimated
+"""
+
+import os
+
+RANKS = '23456789TJQKA'
+SUITS = 'SHDC'
+SEATS = 'NESW'
+NT = 4  # DDS strain order: S, H, D, C, NT
+
+# Cards are bits: suit * 16 + rank, rank 0 = '2' ... 12 = 'A'
+_SUIT_MASKS = [0x1FFF << (16 * s) for s in range(4)]
+
+# Ben numbers strains NT, S, H, D, C; DDS numbers them S, H, D, C, NT
+BEN_STRAIN_TO_DDS = [NT, 0, 1, 2, 3]
+
+# Search nodes (~70k/s) one call from Ben may spend, shared out over its
+# layouts and candidate cards; cards still unsolved when their share runs out
+# get a cheap estimate. Endings usually solve exactly well within it. 0 = exact
+NODE_BUDGET = int(os.environ.get('BEN_DD_NODE_BUDGET', '100000')) or None
+
+
+# ============================================================
+# CARD AND DEAL PARSING
+# ============================================================
+
+def card_bit(symbol):
+    """'SA' -> bit index"""
+    return SUITS.index(symbol[0].upper()) * 16 + RANKS.index(symbol[1].upper())
+
+
+def card_symbol(bit):
+    return SUITS[bit >> 4] + RANKS[bit & 15]
+
+
+def card52_to_bit(card):
+    """Ben's 52-card code (0 = SA, 12 = S2, 13 = HA ...) -> bit index"""
+    return (card // 13) * 16 + 12 - card % 13
+
+
+def bit_to_card52(bit):
+    return (bit >> 4) * 13 + 12 - (bit & 15)
+
+
+def parse_hand(text):
+    """'AKQ.JT9.8.765' (spades first) -> bit mask"""
+    mask = 0
+    for suit, holding in enumerate(text.strip().split('.')):
+        for rank in holding.upper():
+            mask |= 1 << (suit * 16 + RANKS.index(rank))
+    return mask
+
+
+def parse_pbn(deal):
+    """'N:h1 h2 h3 h4' (or four hands starting with North) -> [N, E, S, W] masks"""
+    deal = deal.strip()
+    first = 0
+    if len(deal) > 1 and deal[1] == ':':
+        first = SEATS.index(deal[0].upper())
+        deal = deal[2:]
+    hands = [0] * 4
+    for i, text in enumerate(deal.split()):
+        hands[(first + i) % 4] = parse_hand(text)
+    return hands
+
+
+def format_hand(mask):
+    return '.'.join(
+        ''.join(RANKS[r] for r in range(12, -1, -1) if mask >> (s * 16 + r) & 1)
+        for s in range(4)
+    )
+
+
+def _bits(mask):
+    """Set bits of mask from highest to lowest"""
+    while mask:
+        top = mask.bit_length() - 1
+        yield top
+        mask ^= 1 << top
+
+
+def _count(mask):
+    return mask.bit_count()
+
+
+# ============================================================
+# SEARCH
+# ============================================================
+
+def _beats(card, best, trump):
+    """True if card beats the currently winning card"""
+    if card >> 4 == best >> 4:
+        return card > best
+    return card >> 4 == trump
+
+
+def _trick_winner(trick, leader, trump):
+    best, winner = trick[0], leader
+    for i in range(1, len(trick)):
+        if _beats(trick[i], best, trump):
+            best, winner = trick[i], (leader + i) % 4
+    return winner
+
+
+class _OutOfBudget(Exception):
+    pass
+
+
+def _tt_key(hands, leader):
+    """
+    Position key at a trick boundary using relative ranks: each suit becomes
+    the sequence of owners of its remaining cards from the top down, so
+    positions that differ only in cards already played share an entry.
+    """
+    n, e, s, w = hands
+    everyone = n | e | s | w
+    key = [leader]
+    for m in _SUIT_MASKS:
+        left = everyone & m
+        code = 1
+        while left:
+            bit = 1 << (left.bit_length() - 1)
+            left ^= bit
+            code = code * 4 + (0 if n & bit else 1 if e & bit else 2 if s & bit else 3)
+        key.append(code)
+    return tuple(key)
+
+
+class _Search:
+    """
+    Alpha-beta (null-window) search for one strain.
+
+    Values are N/S tricks from the current position onwards. The transposition
+    table keys positions at trick boundaries by relative ranks and the leader
+    and stores [lower, upper] bounds, so it is shared by every search in the
+    same strain (e.g. all four declarers of a DD table).
+
+    With `limit` set, a search that passes that many nodes in total stops and
+    returns an estimate instead (counted in `estimated`).
+    """
+
+    def __init__(self, trump):
+        self.trump = trump
+        self.tt = {}
+        self.best_lead = {}   # TT key -> lead that last produced a cutoff
+        self.history = {}     # (seat, card) -> cutoff score, for move ordering
+        self.nodes = 0
+        self.limit = None
+        self.estimated = 0
+
+    def ns_tricks(self, hands, leader, trick=()):
+        """N/S tricks from here, including the trick in progress (exact unless over the limit)"""
+        hands = tuple(hands)
+        trick = tuple(trick)
+        lo, hi = 0, _count(hands[leader]) + (1 if trick else 0)
+        if not trick:
+            lo, hi = self._bounds(hands, leader, hi)
+        try:
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if self.ns_at_least(hands, leader, trick, mid):
+                    lo = mid
+                else:
+                    hi = mid - 1
+        except _OutOfBudget:
+            self.estimated += 1
+            return min(max(self._estimate(hands, leader, trick), lo), hi)
+        return lo
+
+    def ns_at_least(self, hands, leader, trick, target):
+        """True if N/S can take at least `target` of the remaining tricks"""
+        if target <= 0:
+            return True
+        left = _count(hands[leader]) + (1 if trick else 0)
+        if target > left:
+            return False
+        self.nodes += 1
+        if self.limit is not None and self.nodes > self.limit:
+            raise _OutOfBudget
+
+        key = None
+        if not trick:
+            if left == 1:
+                last = tuple(hands[(leader + i) % 4].bit_length() - 1 for i in range(4))
+                return (_trick_winner(last, leader, self.trump) % 2 == 0) >= target
+            key = _tt_key(hands, leader)
+            bounds = self.tt.get(key)
+            if bounds is None:
+                bounds = self._bounds(hands, leader, left)
+                self.tt[key] = bounds
+            if bounds[0] >= target:
+                return True
+            if bounds[1] < target:
+                return False
+
+        turn = (leader + len(trick)) % 4
+        ns_turn = turn % 2 == 0
+        result = not ns_turn
+        moves = self._ordered_moves(hands, turn, leader, trick)
+        if key is not None:
+            killer = self.best_lead.get(key)
+            if killer in moves and moves[0] != killer:
+                moves.remove(killer)
+                moves.insert(0, killer)
+        for card in moves:
+            rest = list(hands)
+            rest[turn] &= ~(1 << card)
+            rest = tuple(rest)
+            played = trick + (card,)
+            if len(played) == 4:
+                winner = _trick_winner(played, leader, self.trump)
+                found = self.ns_at_least(rest, winner, (), target - (1 if winner % 2 == 0 else 0))
+            else:
+                found = self.ns_at_least(rest, leader, played, target)
+            if found == ns_turn:
+                result = found
+                self.history[turn, card] = self.history.get((turn, card), 0) + left * left
+                if key is not None:
+                    self.best_lead[key] = card
+                break
+
+        if key is not None:
+            lo, hi = self.tt[key]
+            self.tt[key] = (max(lo, target), hi) if result else (lo, min(hi, target - 1))
+        return result
+
+    def _bounds(self, hands, leader, left):
+        """Cheap (lower, upper) bounds on N/S tricks at a trick boundary"""
+        lo, hi = 0, left
+        quick = self._quick_tricks(hands, leader)
+        # Or lead to partner's top card and cash partner's winners from there
+        pard = (leader + 2) % 4
+        for s in range(4):
+            if hands[leader] & _SUIT_MASKS[s] and self._cashable(hands, pard, s):
+                quick = max(quick, self._quick_tricks(hands, pard))
+                break
+        if leader % 2 == 0:
+            lo = quick
+        else:
+            hi = left - quick
+        if self.trump != NT:
+            # A run of top trumps in one hand always scores, one trick per card
+            trumps = _SUIT_MASKS[self.trump]
+            everyone = (hands[0] | hands[1] | hands[2] | hands[3]) & trumps
+            if everyone:
+                top = 1 << (everyone.bit_length() - 1)
+                owner = next(i for i in range(4) if hands[i] & top)
+                run = 0
+                for bit in _bits(everyone):
+                    if not hands[owner] >> bit & 1:
+                        break
+                    run += 1
+                if owner % 2 == 0:
+                    lo = max(lo, run)
+                else:
+                    hi = min(hi, left - run)
+        return lo, min(max(lo, hi), left)
+
+    def _estimate(self, hands, leader, trick):
+        """
+        Cheap guess at N/S tricks: finish the trick in progress with each
+        player's first-choice card, then give each side its quick tricks and
+        split the rest evenly.
+        """
+        hands = list(hands)
+        ns = 0
+        while trick:
+            turn = (leader + len(trick)) % 4
+            card = self._ordered_moves(hands, turn, leader, trick)[0]
+            hands[turn] &= ~(1 << card)
+            trick += (card,)
+            if len(trick) == 4:
+                leader = _trick_winner(trick, leader, self.trump)
+                ns += leader % 2 == 0
+                trick = ()
+        left = _count(hands[leader])
+        ns_quick = max(self._quick_tricks(hands, 0), self._quick_tricks(hands, 2))
+        ew_quick = max(self._quick_tricks(hands, 1), self._quick_tricks(hands, 3))
+        if ns_quick + ew_quick > left:
+            ns_quick, ew_quick = (ns_quick, left - ns_quick) if leader % 2 == 0 else (left - ew_quick, ew_quick)
+        return ns + ns_quick + (left - ns_quick - ew_quick + 1) // 2
+
+    def _quick_tricks(self, hands, leader):
+        """Top winners the leader can cash without giving up the lead"""
+        return sum(self._cashable(hands, leader, s) for s in range(4))
+
+    def _cashable(self, hands, seat, s):
+        """Top cards of suit s held by seat that win a trick each when cashed from seat"""
+        mine = hands[seat]
+        if not mine & _SUIT_MASKS[s]:
+            return 0
+        lho, pard, rho = (hands[(seat + i) % 4] for i in (1, 2, 3))
+        run = 0
+        for bit in _bits((mine | lho | pard | rho) & _SUIT_MASKS[s]):
+            if not mine >> bit & 1:
+                break
+            run += 1
+        if run and self.trump != NT and s != self.trump:
+            # Each opponent holding trumps can ruff once they run out of the suit
+            trumps = _SUIT_MASKS[self.trump]
+            for opp in (lho, rho):
+                if opp & trumps:
+                    run = min(run, _count(opp & _SUIT_MASKS[s]))
+        return run
+
+    def _ordered_moves(self, hands, turn, leader, trick):
+        """Legal moves, one per group of equivalent cards, most promising first"""
+        hand = hands[turn]
+        if trick:
+            follow = hand & _SUIT_MASKS[trick[0] >> 4]
+            legal = follow or hand
+        else:
+            legal = hand
+
+        # Cards still in play (hands + current trick) decide which cards are equivalent
+        everyone = hands[0] | hands[1] | hands[2] | hands[3]
+        for card in trick:
+            everyone |= 1 << card
+
+        moves = []
+        for s in range(4):
+            mine = legal & _SUIT_MASKS[s]
+            if not mine:
+                continue
+            previous_mine = False
+            for bit in _bits(everyone & _SUIT_MASKS[s]):
+                is_mine = mine >> bit & 1
+                if is_mine and not previous_mine:
+                    moves.append(bit)
+                previous_mine = is_mine
+
+        history = self.history
+        if not trick:
+            pard = hands[(turn + 2) % 4]
+
+            def lead_key(card):
+                suit = _SUIT_MASKS[card >> 4]
+                top = everyone & suit
+                top = 1 << (top.bit_length() - 1)
+                # Cash winners, then lead towards partner's winners, then by history
+                return (not hand & top, not pard & top, -history.get((turn, card), 0),
+                        -_count(hand & suit), card & 15)
+            moves.sort(key=lead_key)
+            return moves
+
+        winner = _trick_winner(trick, leader, self.trump)
+        best = trick[(winner - leader) % 4]
+        if winner % 2 == turn % 2:
+            # Partner is winning: play low, trumps last
+            moves.sort(key=lambda c: (c >> 4 == self.trump, c & 15, -history.get((turn, c), 0)))
+        else:
+            # Cheapest card that takes the lead, then the cheapest card overall
+            moves.sort(key=lambda c: (not _beats(c, best, self.trump), c >> 4 == self.trump,
+                                      -history.get((turn, c), 0), c & 15))
+        return moves
+
+
+def solve_position(hands, trump, leader, trick=(), search=None, budget=None):
+    """
+    Score every legal card for the player on turn.
+
+    hands are [N, E, S, W] masks without the cards already in `trick`; trick
+    holds the bits played to the current trick, starting with `leader`.
+    Returns {bit: tricks for the side on turn from this trick onwards}. With a
+    node budget, cards whose search outgrows their share are estimated.
+    """
+    trick = tuple(trick)
+    hands = list(hands)
+    for card in trick:
+        for seat in range(4):
+            hands[seat] &= ~(1 << card)
+    hands = tuple(hands)
+
+    search = search or _Search(trump)
+    turn = (leader + len(trick)) % 4
+    left = _count(hands[leader]) + (1 if trick else 0)
+
+    hand = hands[turn]
+    legal = (hand & _SUIT_MASKS[trick[0] >> 4]) if trick else 0
+    legal = legal or hand
+
+    everyone = hands[0] | hands[1] | hands[2] | hands[3]
+    for card in trick:
+        everyone |= 1 << card
+
+    # Legal cards in groups of equivalents (adjacent among the cards still in play)
+    groups = []
+    for s in range(4):
+        previous = False
+        for bit in _bits(everyone & _SUIT_MASKS[s]):
+            is_legal = legal >> bit & 1
+            if is_legal:
+                if previous:
+                    groups[-1].append(bit)
+                else:
+                    groups.append([bit])
+            previous = is_legal
+
+    scores = {}
+    for i, group in enumerate(groups):
+        if budget is not None:
+            # Nodes a card leaves unused carry over to the ones still to be scored
+            search.limit = search.nodes + max(1, budget // (len(groups) - i))
+        start = search.nodes
+        bit = group[0]
+        rest = list(hands)
+        rest[turn] &= ~(1 << bit)
+        rest = tuple(rest)
+        played = trick + (bit,)
+        if len(played) == 4:
+            winner = _trick_winner(played, leader, trump)
+            ns = search.ns_tricks(rest, winner) + (1 if winner % 2 == 0 else 0)
+        else:
+            ns = search.ns_tricks(rest, leader, played)
+        if budget is not None:
+            budget = max(0, budget - (search.nodes - start))
+        for bit in group:
+            scores[bit] = ns if turn % 2 == 0 else left - ns
+    search.limit = None
+    return scores
+
+
+def calc_dd_table(hands, strains=range(5), budget=None):
+    """
+    Double-dummy table of a full deal: table[strain][declarer] tricks, with
+    strains in DDS order (S, H, D, C, NT) and declarers N, E, S, W. A node
+    budget is shared out over the entries like solve_position does over cards.
+    """
+    if isinstance(hands, str):
+        hands = parse_pbn(hands)
+    hands = tuple(hands)
+    strains = tuple(strains)
+    total = _count(hands[0])
+    table = [[None] * 4 for _ in range(5)]
+    entries = len(strains) * 4
+    for strain in strains:
+        search = _Search(strain)
+        for declarer in range(4):
+            if budget is not None:
+                search.limit = search.nodes + max(1, budget // entries)
+            start = search.nodes
+            ns = search.ns_tricks(hands, (declarer + 1) % 4)
+            if budget is not None:
+                budget = max(0, budget - (search.nodes - start))
+            entries -= 1
+            table[strain][declarer] = ns if declarer % 2 == 0 else total - ns
+    return table
+
+
+def _table_job(args):
+    return calc_dd_table(*args)
+
+
+def calc_all_tables(deals, strains=range(5), processes=None, budget=None):
+    """
+    DD tables for many deals at once. Deals are PBN strings or [N, E, S, W]
+    masks; with processes > 1 they are spread over a process pool. budget
+    applies to each table.
+    """
+    jobs = [(parse_pbn(d) if isinstance(d, str) else tuple(d), tuple(strains), budget) for d in deals]
+    processes = processes if processes is not None else int(os.environ.get('BEN_DDS_PROCESSES', '1'))
+    if processes > 1 and len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(processes) as pool:
+            return list(pool.map(_table_job, jobs))
+    return [_table_job(job) for job in jobs]
+
+
+# ============================================================
+# BEN / DDS COMPATIBLE ENTRY POINTS
+# ============================================================
+
+class DDSolver:
+    """Drop-in for Ben's ddsolver.DDSolver, backed by the search above"""
+
+    def __init__(self, dds_mode=1, verbose=False, node_budget=NODE_BUDGET):
+        self.dds_mode = dds_mode
+        self.verbose = verbose
+        self.node_budget = node_budget
+
+    def solve(self, strain_i, leader_i, current_trick, hands_pbn, solutions):
+        """
+        Score the cards of the player on turn for every sampled layout.
+
+        strain_i uses Ben's order (NT, S, H, D, C), leader_i is the seat that
+        led to current_trick (52-card codes) and hands_pbn holds one PBN deal per
+        sample. solutions follows DDS: 1 = one best card, 2 = all best cards,
+        3 = every legal card. Returns {card52: [tricks per sample]}.
+        The node budget is shared out over the samples.
+        """
+        trump = BEN_STRAIN_TO_DDS[strain_i]
+        trick = tuple(card52_to_bit(c) for c in current_trick)
+        search = _Search(trump)
+        budget = self.node_budget
+        card_results = {}
+        for i, pbn in enumerate(hands_pbn):
+            share = None if budget is None else budget // (len(hands_pbn) - i)
+            start = search.nodes
+            scores = solve_position(parse_pbn(pbn), trump, leader_i, trick, search, share)
+            if budget is not None:
+                budget = max(0, budget - (search.nodes - start))
+            if solutions in (1, 2) and scores:
+                best = max(scores.values())
+                scores = {bit: v for bit, v in scores.items() if v == best}
+                if solutions == 1:
+                    bit = max(scores)
+                    scores = {bit: best}
+            for bit, tricks in scores.items():
+                card_results.setdefault(bit_to_card52(bit), []).append(tricks)
+        return card_results
+
+    def expected_tricks_dds(self, card_results):
+        return {card: round(sum(values) / len(values), 2) for card, values in card_results.items()}
+
+    def expected_tricks_dds_probability(self, card_results, probabilities_list):
+        return {
+            card: round(sum(v * p for v, p in zip(values, probabilities_list)), 2)
+            for card, values in card_results.items()
+        }
+
+    def p_made_target(self, tricks_needed):
+        def fun(card_results):
+            return {
+                card: round(sum(1 for v in values if v >= tricks_needed) / len(values), 3)
+                for card, values in card_results.items()
+            }
+        return fun
+
+    def calc_dd_table(self, hands_pbn):
+        return calc_dd_table(hands_pbn, budget=self.node_budget)
+
+
+def SolveBoardPBN(pbn, trump, first, current_trick=(), solutions=3):
+    """Python-level SolveBoard: {card symbol: tricks for the side on turn}"""
+    scores = solve_position(parse_pbn(pbn), trump, first, tuple(card_bit(c) for c in current_trick),
+                            budget=NODE_BUDGET)
+    if solutions in (1, 2) and scores:
+        best = max(scores.values())
+        scores = {bit: v for bit, v in scores.items() if v == best}
+        if solutions == 1:
+            scores = {max(scores): best}
+    return {card_symbol(bit): tricks for bit, tricks in scores.items()}
+
+
+def CalcDDtablePBN(pbn):
+    return calc_dd_table(parse_pbn(pbn), budget=NODE_BUDGET)
+
+
+def CalcAllTablesPBN(pbns, strains=range(5)):
+    return calc_all_tables(pbns, strains, budget=NODE_BUDGET)
+
+
+def _ok(*args, **kwargs):
+    """Threading/resource knobs of the native library have nothing to do here"""
+    return 1
+
+
+SetMaxThreads = SetThreading = SetResources = FreeMemory = _ok
+SolveBoard = SolveBoardPBN
+CalcDDtable = CalcDDtablePBN
+CalcAllTables = CalcAllTablesPBN
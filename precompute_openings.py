@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Build the opening-bid index served by the card analysis API.
+
+Runs the progressive (card-by-card) bidding analysis over a corpus of hands in
+every opening position: first to fourth seat, each vulnerability as seen from
+the bidder's side. The results are written to BEN_OPENING_INDEX
+(default: opening_index/). The API then answers matching /analyze/progressive
+and /analyze/html requests from the index without calling the models.
+
+Run from Ben's src directory (where card_analysis_api.py lives), with the same
+models and BEN_RUNTIME the server uses. The index is ignored if they differ:
+
+    python precompute_openings.py --random 20000            # 20000 random hands
+    python precompute_openings.py --hands club_archive.pbn   # hands from a file
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Hands in a PBN Deal tag ("N:h1 h2 h3 h4") or on their own line
+_PBN_DEAL = re.compile(r'[NESW]:((?:[AKQJT2-9]*\.){3}[AKQJT2-9]*(?:\s+(?:[AKQJT2-9]*\.){3}[AKQJT2-9]*){3})')
+_HAND = re.compile(r'^\s*((?:[AKQJT2-9]*\.){3}[AKQJT2-9]*)\s*$')
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Precompute opening-bid analyses for the card analysis API")
+    p.add_argument('--hands', action='append', default=[],
+                   help="File of hands, one per line or as PBN Deal tags (repeatable)")
+    p.add_argument('--random', type=int, default=0, help="Add this many hands from random deals")
+    p.add_argument('--seed', type=int, default=1, help="Seed for --random")
+    p.add_argument('--passes', default='0,1,2,3',
+                   help="Comma-separated numbers of passes before the bidder to cover (0 = dealer)")
+    p.add_argument('-c', '--concurrency', type=int, default=8,
+                   help="Analyses in flight at once (their model calls are batched together)")
+    p.add_argument('-o', '--output', default=None, help="Index directory (default: BEN_OPENING_INDEX)")
+    return p.parse_args(argv)
+
+
+def read_hands(path):
+    """Hand strings found in a file of bare hands or PBN deals"""
+    with open(path) as f:
+        for line in f:
+            deal = _PBN_DEAL.search(line)
+            if deal:
+                yield from deal.group(1).split()
+                continue
+            hand = _HAND.match(line)
+            if hand:
+                yield hand.group(1)
+
+
+def random_hands(count, seed):
+    rng = random.Random(seed)
+    cards = list(range(52))
+    while count > 0:
+        rng.shuffle(cards)
+        for seat in range(min(4, count)):
+            yield sum(1 << c for c in cards[seat * 13:(seat + 1) * 13])
+        count -= 4
+
+
+def corpus_masks(api, args):
+    """Distinct hand masks of the corpus; the order of cards within a suit doesn't matter"""
+    masks = set(random_hands(args.random, args.seed))
+    for path in args.hands:
+        for hand in read_hands(path):
+            try:
+                masks.add(api._parse_hand(hand))
+            except ValueError:
+                pass
+    return sorted(masks)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, os.getcwd())
+    import card_analysis_api as api
+
+    output = args.output or api.OPENING_INDEX_DIR
+    api.load_models()
+    api.opening_index.keys = None  # compute everything, even if an old index was loaded
+
+    masks = corpus_masks(api, args)
+    passes = [int(p) for p in args.passes.split(',') if p.strip()]
+    slots = [mask << 4 | p << 2 | vuln for mask in masks for p in passes for vuln in range(4)]
+    print(f"🃏 {len(masks)} hands x {len(passes) * 4} positions = {len(slots)} analyses")
+
+    entries = {}
+    start = time.time()
+
+    def analyze(slot):
+        result = api.analyze_progressive(api._opening_request(slot))
+        return slot, [(step["recommended_bid"], step["confidence"]) for step in result["analysis_steps"]]
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for done, (slot, bids) in enumerate(pool.map(analyze, slots), start=1):
+            entries[slot] = bids
+            if done % 500 == 0 or done == len(slots):
+                rate = done / (time.time() - start)
+                print(f"   {done}/{len(slots)} ({rate:.1f}/s, ~{(len(slots) - done) / rate / 60:.0f} min left)")
+
+    api.OpeningIndex.write(output, entries, api.model_version)
+    print(f"✅ Wrote {len(entries)} entries to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
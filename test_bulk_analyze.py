@@ -0,0 +1,132 @@
+"""
+Tests for the PBN/LIN readers in bulk_analyze.py: a few fixture boards in each
+format, checked down to auction, hand order and play order.
+
+    python -m pytest -q test_bulk_analyze.py
+"""
+
+import json
+
+import bulk_analyze as bulk
+
+SOLID = ['AKQJT98765432...', '.AKQJT98765432..', '..AKQJT98765432.', '...AKQJT98765432']
+
+# South plays 4S after West leads. The Play section is in columns W N E S, so
+# the order cards hit the table depends on who won the previous trick: South
+# wins 1 and 2, East wins 3, North ruffs 4 and leads to the unfinished fifth.
+PBN_SUIT = """\
+% PBN 2.1
+[Event "Club pairs"]
+[Board "7"]
+[Dealer "S"]
+[Vulnerable "EW"]
+[Deal "W:KQJ.KQT.KQ2.QJT9 T98.J32.AJ3.AK87 A76.A54.T98.K654 5432.9876.7654.3"]
+[Auction "S"]
+1S {opening} Pass 2S! =1= Pass
+4S AP
+[Play "W"]
+HK H2 H5 HA
+S2 S3 S4 SA
+D2 D3 DA D4
+C2 S5 CA C3
+- HJ H3 -
+*
+
+[Event "Club pairs"]
+[Board "8"]
+[Dealer "W"]
+[Vulnerable "All"]
+[Deal "N:AKQJT98765432... .AKQJT98765432.. ..AKQJT98765432. ...AKQJT98765432"]
+[Auction "W"]
+1C X XX 1NT
+Pass Pass Pass
+[Play "S"]
+DA CA SA HA
+"""
+
+# 1NT: with no trumps North's spade on trick 4 is only a discard
+PBN_NOTRUMP_AUCTION = ['1N', 'PASS', 'PASS', 'PASS']
+
+LIN_TWO_BOARDS = (
+    "qx|o5|md|3SAKQJT98765432,HAKQJT98765432,DAKQJT98765432,CAKQJT98765432|"
+    "sv|n|mb|1N!|an|15-17|mb|p|mb|2C|mb|d|mb|r|mb|p|mb|p|mb|p|\n"
+    "pc|d2|pc|DA|pc|c3|pc|ca|pg||\n"
+    "qx|o6|md|1SAKQJT98765432,HAKQJT98765432,DAKQJT98765432,|sv|b|mb|p|\n"
+    "mb|p|mb|p|mb|p|\n"
+)
+
+
+def _board(tmp_path, name, text, reader):
+    path = tmp_path / name
+    path.write_text(text)
+    return list(reader(str(path)))
+
+
+def test_pbn_calls_expands_all_pass_and_drops_notes():
+    calls = bulk._pbn_calls(['1S {opening} Pass 2S! =1= Pass', '4S AP', '7N'])
+    assert calls == ['1S', 'PASS', '2S', 'PASS', '4S', 'PASS', 'PASS', 'PASS', '7N']
+    assert bulk._pbn_calls(['1C X XX 1NT', 'P - + $2']) == ['1C', 'X', 'XX', '1N', 'PASS']
+
+
+def test_pbn_play_follows_trick_winners():
+    lines = ['HK H2 H5 HA', 'S2 S3 S4 SA', 'D2 D3 DA D4', 'C2 S5 CA C3', '- HJ H3 -', '*']
+    play = bulk._pbn_play(['1S', 'PASS', '4S', 'PASS', 'PASS', 'PASS'], 3, lines)
+    assert play == ['HK', 'H2', 'H5', 'HA',    # West leads, South wins
+                    'SA', 'S2', 'S3', 'S4',    # South leads, South wins
+                    'D4', 'D2', 'D3', 'DA',    # South leads, East wins
+                    'CA', 'C3', 'C2', 'S5',    # East leads, North ruffs
+                    'HJ', 'H3']                # North leads, trick unfinished
+
+
+def test_pbn_play_in_notrump_ignores_discards():
+    lines = ['HK H2 H5 HA', 'S2 S3 S4 SA', 'D2 D3 DA D4', 'C2 S5 CA C3', 'C4 C5 C6 C7']
+    play = bulk._pbn_play(PBN_NOTRUMP_AUCTION, 3, lines)
+    # East's CA wins trick 4 over the spade discard and leads to trick 5
+    assert play[12:] == ['CA', 'C3', 'C2', 'S5', 'C6', 'C7', 'C4', 'C5']
+
+
+def test_read_pbn_boards(tmp_path):
+    first, second = _board(tmp_path, 'club.pbn', PBN_SUIT, bulk.read_pbn)
+    assert first['id'].endswith('#0') and second['id'].endswith('#1')
+    assert (first['board'], first['dealer'], first['vuln']) == ('7', 'S', [False, True])
+    # Deal starts with West; hands come back N, E, S, W
+    assert first['hands'] == ['T98.J32.AJ3.AK87', 'A76.A54.T98.K654', '5432.9876.7654.3', 'KQJ.KQT.KQ2.QJT9']
+    assert first['auction'][-4:] == ['4S', 'PASS', 'PASS', 'PASS']
+    assert first['play'][12:16] == ['CA', 'C3', 'C2', 'S5']
+    assert (second['dealer'], second['vuln'], second['hands']) == ('W', [True, True], SOLID)
+    assert second['auction'] == ['1C', 'X', 'XX', '1N', 'PASS', 'PASS', 'PASS']
+    assert second['play'] == ['DA', 'CA', 'SA', 'HA']
+
+
+def test_read_lin_hand_order_and_calls(tmp_path):
+    first, second = _board(tmp_path, 'club.lin', LIN_TWO_BOARDS, bulk.read_lin)
+    assert (first['id'].endswith('#0'), first['board'], first['dealer']) == (True, '5', 'N')
+    assert first['vuln'] == [True, False]
+    # md lists South, West, North, East
+    assert first['hands'] == ['..AKQJT98765432.', '...AKQJT98765432', 'AKQJT98765432...', '.AKQJT98765432..']
+    assert first['auction'] == ['1N', 'PASS', '2C', 'X', 'XX', 'PASS', 'PASS', 'PASS']
+    assert first['play'] == ['D2', 'DA', 'C3', 'CA']
+    assert (second['board'], second['dealer'], second['vuln']) == ('6', 'S', [True, True])
+    assert second['auction'] == ['PASS'] * 4
+
+
+def test_lin_missing_fourth_hand_is_filled(tmp_path):
+    _, board = _board(tmp_path, 'club.lin', LIN_TWO_BOARDS, bulk.read_lin)
+    # East was left out of md; it gets the clubs nobody else holds
+    assert board['hands'] == ['..AKQJT98765432.', '...AKQJT98765432', 'AKQJT98765432...', '.AKQJT98765432..']
+    partial = bulk._lin_board('x.lin', 0, {'md': '2SAK,HAK,'})
+    assert partial['dealer'] == 'W'
+    # Too few cards to infer the rest: hands are left as given
+    assert partial['hands'] == ['...', '', 'AK...', '.AK..']
+
+
+def test_resume_retries_errors(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    records = [{"id": "a#0", "status": "success"}, {"id": "a#1", "status": "error", "detail": "bad hand"},
+               {"id": "a#2", "status": "success"}]
+    # The last line was torn by the interruption
+    path.write_text(''.join(json.dumps(r) + '\n' for r in records) + '{"id": "a#3", "sta')
+    sink = bulk.JsonlSink(str(path), resume=True)
+    sink.close()
+    assert sink.done == {"a#0", "a#2"}
+    assert [json.loads(line)["id"] for line in path.read_text().splitlines()] == ["a#0", "a#2"]
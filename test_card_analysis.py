@@ -1,22 +1,37 @@
 """
 Test Script for Card-by-Card Analysis API
+
+Posts a few fixed hands to a running server and prints the results. For
+performance numbers use benchmark.py instead. Under pytest the live-server
+tests are skipped unless BEN_API_URL is set.
 """
 
+import asyncio
+import os
+import threading
+import time
+from types import SimpleNamespace
 import requests
 import json
 
-# Change this to your Railway URL after deployment
-API_URL = "http://localhost:8000"
+import numpy as np
+import pytest
+
+# Set BEN_API_URL to your Railway URL after deployment
+API_URL = os.environ.get("BEN_API_URL", "http://localhost:8080")
 # API_URL = "https://YOUR-APP.up.railway.app"
 
+live = pytest.mark.skipif(not os.environ.get("BEN_API_URL"), reason="needs a running server (set BEN_API_URL)")
+
 
+@live
 def test_basic_analysis():
     """Test basic card-by-card analysis"""
     print("\n" + "="*70)
     print("TEST 1: Basic Opening Bid Analysis")
     print("="*70)
     
-    response = requests.post(f"{API_URL}/analyze", json={
+    response = requests.post(f"{API_URL}/analyze/progressive", json={
         "hand": "AK5.QJ3.KQ82.AT3",
         "auction": [],
         "seat": 0,
@@ -50,13 +65,14 @@ def test_basic_analysis():
         print(response.text)
 
 
+@live
 def test_response_analysis():
     """Test analysis of response to partner's bid"""
     print("\n" + "="*70)
     print("TEST 2: Response to Partner's 1♣")
     print("="*70)
     
-    response = requests.post(f"{API_URL}/analyze", json={
+    response = requests.post(f"{API_URL}/analyze/progressive", json={
         "hand": "KJ54.AQ3.K82.AT3",
         "auction": ["1C"],
         "seat": 1,
@@ -75,6 +91,7 @@ def test_response_analysis():
         print(f"❌ Error: {response.status_code}")
 
 
+@live
 def test_html_output():
     """Test HTML visualization"""
     print("\n" + "="*70)
@@ -102,13 +119,14 @@ def test_html_output():
         print(f"❌ Error: {response.status_code}")
 
 
+@live
 def test_weak_hand():
     """Test with a weak hand"""
     print("\n" + "="*70)
     print("TEST 4: Weak Hand (Should Stay PASS Longer)")
     print("="*70)
     
-    response = requests.post(f"{API_URL}/analyze", json={
+    response = requests.post(f"{API_URL}/analyze/progressive", json={
         "hand": "543.862.J93.9742",
         "auction": [],
         "seat": 0,
@@ -134,13 +152,14 @@ def test_weak_hand():
         print(f"❌ Error: {response.status_code}")
 
 
+@live
 def test_preempt():
     """Test preemptive hand"""
     print("\n" + "="*70)
     print("TEST 5: Preemptive Hand")
     print("="*70)
     
-    response = requests.post(f"{API_URL}/analyze", json={
+    response = requests.post(f"{API_URL}/analyze/progressive", json={
         "hand": "5.74.KQJ98532.86",
         "auction": [],
         "seat": 0,
@@ -165,6 +184,251 @@ def test_preempt():
         print(f"❌ Error: {response.status_code}")
 
 
+# ------------------------------------------------------------
+# Unit tests: no server and no models needed
+# ------------------------------------------------------------
+
+HANDS = ["AKQJ.AKQ.AKQ.AKQ", "T987.JT9.JT9.JT9", "65.8765.8765.876", "432.432.432.5432"]
+
+
+@pytest.fixture(scope="module")
+def api():
+    import card_analysis_api
+    return card_analysis_api
+
+
+def _requests(api, n):
+    """n distinct valid deals (they differ in the auction)"""
+    openings = ["1C", "1D", "1H", "1S", "1N", "2C", "2D", "2H"]
+    return [api.AnalysisRequest(dealer="N", vuln=[False, False], hands=HANDS, auction=[call])
+            for call in openings[:n]]
+
+
+@pytest.fixture
+def batch(api, monkeypatch):
+    """analyze_batch on a 1 worker + 1 queued executor, with a stand-in analysis"""
+    executor = api.InferenceExecutor(workers=1, max_queue=1)
+    failing = set()
+
+    def analyze(request, key=None, deadline=None):
+        time.sleep(0.01)
+        if request.auction[0] in failing:
+            raise RuntimeError(f"{request.auction[0]} failed")
+        return {"status": "success", "auction": request.auction}
+
+    monkeypatch.setattr(api, "models", object())
+    monkeypatch.setattr(api, "inference", executor)
+    monkeypatch.setattr(api, "in_flight", api.SingleFlight())
+    monkeypatch.setattr(api, "_analyze_deal", analyze)
+    return executor, failing
+
+
+def test_acquire_up_to_admits_what_fits(api):
+    executor = api.InferenceExecutor(workers=2, max_queue=2)
+    assert executor.acquire_up_to(3) == 3      # all of them
+    assert executor.acquire_up_to(3) == 1      # only the slot left
+    with pytest.raises(api.InferenceSaturated) as err:
+        executor.acquire_up_to(2)
+    assert err.value.status_code == 429 and int(err.value.headers["Retry-After"]) >= 1
+    assert executor.stats()["rejected"] == 2
+    executor.release(4)
+    assert executor.acquire_up_to(4) == 4
+
+
+def test_batch_larger_than_queue_completes(api, batch):
+    executor, _ = batch
+    result = asyncio.run(api.analyze_batch(api.BatchAnalysisRequest(deals=_requests(api, 5))))
+    assert [board["status"] for board in result["results"]] == ["success"] * 5
+    assert executor._admitted == 0
+
+
+def test_batch_saturated_is_rejected(api, batch):
+    executor, _ = batch
+    executor.acquire(2)
+    with pytest.raises(api.InferenceSaturated) as err:
+        asyncio.run(api.analyze_batch(api.BatchAnalysisRequest(deals=_requests(api, 3))))
+    assert err.value.status_code == 429 and "Retry-After" in err.value.headers
+    assert executor._admitted == 2
+    executor.release(2)
+
+
+def test_batch_releases_slots_after_error(api, batch):
+    executor, failing = batch
+    failing.add("1D")
+    result = asyncio.run(api.analyze_batch(api.BatchAnalysisRequest(deals=_requests(api, 3))))
+    assert [board["status"] for board in result["results"]] == ["success", "error", "success"]
+    assert "1D failed" in result["results"][1]["detail"]
+    assert executor._admitted == 0
+    assert executor.acquire_up_to(2) == 2
+
+
+def test_identical_requests_share_one_analysis(api, batch, monkeypatch):
+    executor, _ = batch
+    calls = []
+    analyze = api._analyze_deal
+    monkeypatch.setattr(api, "_analyze_deal", lambda request, *args: calls.append(request) or analyze(request, *args))
+
+    async def clients():
+        return await asyncio.gather(*[api._analyze_shared(request) for request in _requests(api, 1) * 4])
+
+    results = asyncio.run(clients())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert api.in_flight.stats() == {"started": 1, "coalesced": 3, "in_flight": 0}
+    assert executor._admitted == 0
+
+
+def test_single_flight_shares_errors_then_starts_afresh(api):
+    flights = api.SingleFlight()
+    starts = []
+
+    async def failing():
+        starts.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def clients():
+        outcomes = await asyncio.gather(*[flights.join("key", failing) for _ in range(3)],
+                                        return_exceptions=True)
+        # Landed: the next caller starts a new computation
+        again = await asyncio.gather(flights.join("key", failing), return_exceptions=True)
+        return outcomes + again
+
+    outcomes = asyncio.run(clients())
+    assert [str(e) for e in outcomes] == ["boom"] * 4
+    assert len(starts) == 2
+    assert flights.stats() == {"started": 2, "coalesced": 2, "in_flight": 0}
+
+
+def _replay(api, store, play, bids=2, stop=None):
+    """
+    Analyze a deal the way _analyze_deal drives Ben: one replayable step per
+    bid and per card, stopping before card `stop` as a deadline would. Returns
+    the number of steps computed afresh.
+    """
+    computed = []
+    step = api._replayable(lambda decision: computed.append(decision) or decision, "card")
+    session = store.session("deal", play)
+    api._replay_local.session = session
+    try:
+        for bid in range(bids):
+            step(bid)
+            session.mark_bid(None)
+        for i, card in enumerate(play):
+            if stop is not None and i >= stop:
+                break
+            step(card)
+            session.mark_card(None)
+    finally:
+        api._replay_local.session = None
+    store.save("deal", play, session)
+    return len(computed)
+
+
+def test_extending_play_computes_only_new_cards(api):
+    store = api.DealStateStore()
+    play = ["SA", "S2", "S3", "S4", "HA", "H2"]
+    assert _replay(api, store, play[:4]) == 6
+    assert _replay(api, store, play) == 2
+    # A different fifth card keeps the bidding and the first trick
+    assert _replay(api, store, play[:4] + ["DA"]) == 1
+    assert store.stats()["replayed_steps"] == 6 + 6
+
+
+def test_partial_result_does_not_block_later_saves(api):
+    store = api.DealStateStore()
+    play = ["SA", "S2", "S3", "S4", "HA", "H2", "H3"]
+    # Asked for all seven cards but cut short after two: only those are kept,
+    # so shorter complete runs can still save theirs
+    assert _replay(api, store, play, stop=2) == 4
+    assert _replay(api, store, play[:5]) == 3
+    assert _replay(api, store, play[:6]) == 1
+    assert _replay(api, store, play) == 1
+
+
+def test_tier_is_part_of_state_key(api):
+    deal = dict(dealer="N", vuln=[False, False], hands=HANDS, auction=["1C"], play=["SA"])
+    keys = {api._deal_key(api.AnalysisRequest(tier=tier, **deal)) for tier in ("fast", "standard", "thorough")}
+    assert len(keys) == 3
+    # ...while the play is not
+    assert api._deal_key(api.AnalysisRequest(**dict(deal, play=["SA", "S2"]))) in keys
+
+
+def test_bucket_pads_to_power_of_two(api, monkeypatch):
+    monkeypatch.setattr(api, "BATCH_MAX_SIZE", 16)
+    assert [api._bucket(rows) for rows in (1, 2, 3, 5, 8, 9, 16)] == [1, 2, 4, 8, 8, 16, 16]
+    # Past the cap a batch runs at its own size
+    assert api._bucket(17) == 17 and api._bucket(40) == 40
+
+
+def test_split_rows_limits_chunks(api):
+    calls = [SimpleNamespace(rows=rows) for rows in (3, 1, 2, 4, 6)]
+    chunks = [[call.rows for call in chunk] for chunk in api._split_rows(calls, 4)]
+    # A call larger than the limit still gets a chunk of its own
+    assert chunks == [[3, 1], [2], [4], [6]]
+
+
+class _Doubler:
+    """Model whose forward pass doubles its input and records the batch shapes it saw"""
+
+    def __init__(self):
+        self.shapes = []
+
+    def predict(self, x):
+        self.shapes.append(x.shape)
+        return x * 2
+
+
+def _batched_predict(api, model, sizes, max_batch):
+    """One thread per size, each predicting its own rows through a shared ModelBatcher"""
+    batcher = api.ModelBatcher(max_wait_ms=1000, max_batch=max_batch)
+    proxy = api.BatchedModel("doubler", model)
+    inputs = [np.full((rows, 3), i + 1, dtype=np.float32) for i, rows in enumerate(sizes)]
+    outputs = [None] * len(sizes)
+
+    def analysis(i):
+        with batcher.participate(reserved=True):
+            outputs[i] = proxy.predict(inputs[i])
+
+    batcher.reserve(len(sizes))
+    threads = [threading.Thread(target=analysis, args=(i,)) for i in range(len(sizes))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    for x, y in zip(inputs, outputs):
+        np.testing.assert_array_equal(y, x * 2)
+    return batcher.stats()
+
+
+def test_batched_model_merges_and_pads(api, monkeypatch):
+    monkeypatch.setattr(api, "BATCH_MAX_SIZE", 256)
+    model = _Doubler()
+    stats = _batched_predict(api, model, [1, 2, 2], max_batch=256)
+    # 5 rows from three callers: one forward pass padded to 8
+    assert model.shapes == [(8, 3)]
+    assert (stats["model_calls"], stats["requests"], stats["rows"]) == (1, 3, 5)
+
+
+def test_batched_model_splits_past_max_batch(api, monkeypatch):
+    monkeypatch.setattr(api, "BATCH_MAX_SIZE", 256)
+    model = _Doubler()
+    stats = _batched_predict(api, model, [3, 3, 2], max_batch=4)
+    # No two of them fit in 4 rows: 3 is padded to 4, 2 runs as is
+    assert sorted(model.shapes) == [(2, 3), (4, 3), (4, 3)]
+    assert stats["model_calls"] == 3
+
+
+@pytest.mark.parametrize("dealer", ["NE", "", "n", "X"])
+def test_deal_parse_rejects_bad_dealer(api, dealer):
+    with pytest.raises(ValueError, match="dealer"):
+        api.Deal.parse(dealer, [False, False], HANDS, [], [])
+
+
+def test_deal_parse_accepts_each_seat(api):
+    assert [api.Deal.parse(seat, [False, True], HANDS, [], []).dealer for seat in "NESW"] == [0, 1, 2, 3]
+
+
 def main():
     print("\n" + "🌉"*35)
     print("    CARD-BY-CARD ANALYSIS API - TEST SUITE")
@@ -175,12 +439,10 @@ def main():
         # Check health
         health = requests.get(f"{API_URL}/health", timeout=5)
         if health.status_code == 200:
-            data = health.json()
-            if data.get('models_loaded'):
-                print("✅ API is ready!\n")
-            else:
-                print("⏳ API is loading models...\n")
-                return
+            print("✅ API is ready!\n")
+        elif health.status_code == 503:
+            print(f"⏳ API is {health.json().get('status', 'loading')}...\n")
+            return
         else:
             print("❌ API not responding\n")
             return
@@ -191,17 +453,9 @@ def main():
     
     # Run tests
     test_basic_analysis()
-    input("\nPress Enter to continue...")
-    
     test_response_analysis()
-    input("\nPress Enter to continue...")
-    
     test_html_output()
-    input("\nPress Enter to continue...")
-    
     test_weak_hand()
-    input("\nPress Enter to continue...")
-    
     test_preempt()
     
     print("\n" + "🌉"*35)
@@ -0,0 +1,115 @@
+"""
+Tests for dd_solver.py: exact results against a brute-force minimax on small
+endings, and bounded time on full hands.
+
+    python -m pytest -q test_dd_solver.py
+"""
+
+import random
+import time
+
+import dd_solver as dd
+
+
+def _deal(rng, cards):
+    """Random [N, E, S, W] masks with `cards` cards each"""
+    deck = list(range(52))
+    rng.shuffle(deck)
+    hands = [0] * 4
+    for seat in range(4):
+        for card in deck[seat * 13:seat * 13 + cards]:
+            hands[seat] |= 1 << dd.card52_to_bit(card)
+    return hands
+
+
+def _legal(hand, trick):
+    follow = hand & dd._SUIT_MASKS[trick[0] >> 4] if trick else 0
+    return list(dd._bits(follow or hand))
+
+
+def _minimax(hands, trump, leader, trick):
+    """N/S tricks from here (including the trick in progress), trying every card"""
+    if not trick and not hands[leader]:
+        return 0
+    turn = (leader + len(trick)) % 4
+    values = []
+    for card in _legal(hands[turn], trick):
+        rest = list(hands)
+        rest[turn] &= ~(1 << card)
+        played = trick + (card,)
+        if len(played) == 4:
+            winner = dd._trick_winner(played, leader, trump)
+            values.append(_minimax(rest, trump, winner, ()) + (winner % 2 == 0))
+        else:
+            values.append(_minimax(rest, trump, leader, played))
+    return max(values) if turn % 2 == 0 else min(values)
+
+
+def _play_into_trick(rng, hands, leader, length):
+    """Play `length` random legal cards of the first trick; returns (hands, trick)"""
+    hands = list(hands)
+    trick = ()
+    for i in range(length):
+        seat = (leader + i) % 4
+        card = rng.choice(_legal(hands[seat], trick))
+        hands[seat] &= ~(1 << card)
+        trick += (card,)
+    return hands, trick
+
+
+def test_solve_position_matches_minimax():
+    rng = random.Random(7)
+    for _ in range(150):
+        cards = rng.randint(1, 3)
+        trump = rng.randrange(5)
+        leader = rng.randrange(4)
+        hands, trick = _play_into_trick(rng, _deal(rng, cards), leader, rng.randrange(4))
+        turn = (leader + len(trick)) % 4
+        left = cards
+        for card, tricks in dd.solve_position(hands, trump, leader, trick).items():
+            rest = list(hands)
+            rest[turn] &= ~(1 << card)
+            played = trick + (card,)
+            if len(played) == 4:
+                winner = dd._trick_winner(played, leader, trump)
+                ns = _minimax(rest, trump, winner, ()) + (winner % 2 == 0)
+            else:
+                ns = _minimax(rest, trump, leader, played)
+            assert tricks == (ns if turn % 2 == 0 else left - ns)
+
+
+def test_budget_large_enough_is_exact():
+    rng = random.Random(11)
+    for _ in range(20):
+        hands = _deal(rng, 4)
+        exact = dd.solve_position(hands, dd.NT, 1)
+        assert dd.solve_position(hands, dd.NT, 1, budget=10 ** 6) == exact
+
+
+def test_budget_bounds_full_hands():
+    rng = random.Random(3)
+    layouts = ['N:' + ' '.join(dd.format_hand(h) for h in _deal(rng, 13)) for _ in range(20)]
+    solver = dd.DDSolver(node_budget=20000)
+    start = time.time()
+    results = solver.solve(0, 1, [], layouts, 3)
+    assert time.time() - start < 5
+    # Every card of East's hand is scored in every layout
+    assert sum(len(values) for values in results.values()) == 13 * len(layouts)
+    assert all(0 <= v <= 13 for values in results.values() for v in values)
+
+
+def test_dd_table_of_solid_suits():
+    # N holds the spades, E the hearts, S the diamonds, W the clubs
+    table = dd.calc_dd_table('N:AKQJT98765432... .AKQJT98765432.. ..AKQJT98765432. ...AKQJT98765432')
+    assert table[0][0] == 13   # spades by North: ruffs everything
+    assert table[dd.NT][0] == 0   # NT by North: East runs the hearts
+    assert table[dd.NT][1] == 0   # NT by East: South runs the diamonds
+
+
+def test_solutions_modes():
+    pbn = 'N:AK.. QJ.. T9.. 87..'
+    solver = dd.DDSolver()
+    every = solver.solve(0, 0, [], [pbn], 3)
+    best = solver.solve(0, 0, [], [pbn], 1)
+    assert set(every) == {dd.bit_to_card52(dd.card_bit('SA')), dd.bit_to_card52(dd.card_bit('SK'))}
+    assert list(best.values()) == [[2]]